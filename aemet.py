@@ -0,0 +1,286 @@
+import hashlib
+import io
+import sys
+import tarfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import NamedTuple
+
+import requests
+
+from gazetteer import ensure_gazetteer, get_gazetteer
+from geocoding import normalize_location
+from http_client import http
+from resilience import breaker
+from singleflight import group
+
+# --- Almacén de Avisos AEMET ---
+# El boletín de avisos se descarga una vez por intervalo de refresco (en un hilo de fondo),
+# se parsea a registros y se indexa por zona, provincia y municipio: cada consulta de
+# check_aemet_alerts es una búsqueda O(1) en un diccionario, sin tocar la red.
+
+AEMET_AVISOS_URL = "https://opendata.aemet.es/opendata/api/avisos_de_fenomenos_meteorologicos_adversos/archivo/hoy"
+
+REFRESH_INTERVAL = 10 * 60
+# Una key rechazada por AEMET no se vuelve a probar hasta pasado este tiempo
+INVALID_KEY_TTL = 10 * 60
+
+CAP_NS = "{urn:oasis:names:tc:emergency:cap:1.2}"
+
+# Código INE de provincia (dígitos 3-4 del código de zona AEMET "CCPPZZ")
+PROVINCIAS = {
+    "01": "Álava", "02": "Albacete", "03": "Alicante", "04": "Almería", "05": "Ávila",
+    "06": "Badajoz", "07": "Illes Balears", "08": "Barcelona", "09": "Burgos", "10": "Cáceres",
+    "11": "Cádiz", "12": "Castellón", "13": "Ciudad Real", "14": "Córdoba", "15": "A Coruña",
+    "16": "Cuenca", "17": "Girona", "18": "Granada", "19": "Guadalajara", "20": "Gipuzkoa",
+    "21": "Huelva", "22": "Huesca", "23": "Jaén", "24": "León", "25": "Lleida",
+    "26": "La Rioja", "27": "Lugo", "28": "Madrid", "29": "Málaga", "30": "Murcia",
+    "31": "Navarra", "32": "Ourense", "33": "Asturias", "34": "Palencia", "35": "Las Palmas",
+    "36": "Pontevedra", "37": "Salamanca", "38": "Santa Cruz de Tenerife", "39": "Cantabria", "40": "Segovia",
+    "41": "Sevilla", "42": "Soria", "43": "Tarragona", "44": "Teruel", "45": "Toledo",
+    "46": "Valencia", "47": "Valladolid", "48": "Bizkaia", "49": "Zamora", "50": "Zaragoza",
+    "51": "Ceuta", "52": "Melilla",
+}
+
+# Capitales y nombres alternativos que no coinciden con el nombre de su provincia
+ALIAS_PROVINCIA = {
+    "vitoria": "01", "vitoria-gasteiz": "01", "araba": "01", "alacant": "03", "baleares": "07",
+    "palma": "07", "palma de mallorca": "07", "mallorca": "07", "castello": "12", "la coruna": "15",
+    "coruna": "15", "gerona": "17", "san sebastian": "20", "donostia": "20", "guipuzcoa": "20",
+    "lerida": "25", "logrono": "26", "oviedo": "33", "gijon": "33", "gran canaria": "35",
+    "pamplona": "31", "iruna": "31", "orense": "32", "vigo": "36", "tenerife": "38",
+    "santander": "39", "bilbao": "48", "vizcaya": "48", "elche": "03",
+    "cartagena": "30", "jerez de la frontera": "11", "algeciras": "11", "marbella": "29",
+}
+
+
+class AemetError(Exception):
+    """Error devuelto por la API de AEMET con un mensaje apto para el usuario."""
+
+
+class AemetAuthError(AemetError):
+    """API key rechazada: es un error de configuración, no una caída de AEMET."""
+
+
+class AemetWarning(NamedTuple):
+    zone: str
+    province: str
+    area: str
+    phenomenon: str
+    level: str
+    onset: datetime
+    expires: datetime
+
+
+def _parse_time(value: str):
+    try:
+        parsed = datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+    # Sin zona horaria asumimos hora local para poder comparar con ahora
+    return parsed if parsed is None or parsed.tzinfo else parsed.astimezone()
+
+
+def _warnings_from_info(info) -> list:
+    """Avisos (uno por zona) de un bloque <info> de un documento CAP de AEMET."""
+    # AEMET publica cada aviso en español e inglés; nos quedamos con el español
+    if not (info.findtext(f"{CAP_NS}language") or "es").startswith("es"):
+        return []
+    params = {
+        p.findtext(f"{CAP_NS}valueName"): p.findtext(f"{CAP_NS}value") or ""
+        for p in info.iter(f"{CAP_NS}parameter")
+    }
+    level = params.get("AEMET-Meteoalerta nivel", "").lower()
+    if not level or level == "verde":
+        return []
+    # Los textos repetidos (nivel, fenómeno, provincia) se internan: miles de registros comparten unas pocas cadenas
+    phenomenon = sys.intern(params.get("AEMET-Meteoalerta fenomeno", "").split(";")[-1] or info.findtext(f"{CAP_NS}event", ""))
+    level = sys.intern(level)
+    onset = _parse_time(info.findtext(f"{CAP_NS}onset"))
+    expires = _parse_time(info.findtext(f"{CAP_NS}expires"))
+    warnings = []
+    for area in info.iter(f"{CAP_NS}area"):
+        zone = ""
+        for geocode in area.iter(f"{CAP_NS}geocode"):
+            if geocode.findtext(f"{CAP_NS}valueName") == "AEMET-Meteoalerta zona":
+                zone = geocode.findtext(f"{CAP_NS}value") or ""
+        warnings.append(AemetWarning(
+            zone=zone,
+            province=PROVINCIAS.get(zone[2:4], ""),
+            area=area.findtext(f"{CAP_NS}areaDesc", ""),
+            phenomenon=phenomenon,
+            level=level,
+            onset=onset,
+            expires=expires,
+        ))
+    return warnings
+
+
+def iter_cap(source):
+    """Itera los avisos de un documento CAP con iterparse, liberando cada <info> (y sus
+    polígonos) en cuanto se procesa: la memoria no crece con el tamaño del documento."""
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = elem
+        elif event == "end" and elem.tag == f"{CAP_NS}info":
+            yield from _warnings_from_info(elem)
+            root.clear()
+
+
+def iter_bulletin(stream):
+    """Lee el boletín de 'archivo' de forma incremental: un tar (comprimido o no) con
+    documentos CAP, o un CAP suelto. stream es cualquier fichero binario no seekable."""
+    reader = stream if hasattr(stream, "peek") else io.BufferedReader(stream)
+    if reader.peek(1)[:1] == b"<":
+        yield from iter_cap(reader)
+        return
+    # Modo "r|*": tar en streaming, miembro a miembro y sin retroceder
+    with tarfile.open(fileobj=reader, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith(".xml"):
+                yield from iter_cap(archive.extractfile(member))
+
+
+class AemetWarningsStore:
+    """Boletín de avisos en memoria, indexado y refrescado periódicamente en segundo plano."""
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        # Key del refresco de fondo: la última que AEMET ha aceptado, nunca la de una petición sin validar
+        self.api_key = ""
+        self.updated_at = 0.0
+        self._by_zone = {}
+        self._by_province = {}
+        self._by_area = {}
+        self._valid_keys = set()
+        self._invalid_keys = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start_refresher(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refresh_loop, name="aemet-refresh", daemon=True)
+                self._thread.start()
+
+    def _refresh_loop(self) -> None:
+        # Por si nadie ha generado aún el nomenclátor local (municipio -> zona); ver gazetteer.py
+        ensure_gazetteer(self.api_key)
+        # La carga inicial del boletín la hace ensure_loaded en la primera consulta
+        while True:
+            time.sleep(min(60, self.refresh_interval))
+            if time.time() - self.updated_at >= self.refresh_interval:
+                try:
+                    self.refresh()
+                except Exception:
+                    # Mantenemos el último boletín bueno; se reintenta en la siguiente vuelta
+                    pass
+
+    def refresh(self, api_key: str = None) -> None:
+        """Descarga el boletín (metadatos + datos) y sustituye los índices de golpe. Sin
+        `api_key`, con la última key validada. Si otra sesión (o el hilo de fondo) ya lo está
+        descargando con esa key, espera a esa descarga. Con el breaker de AEMET abierto falla
+        al instante (CircuitOpenError)."""
+        api_key = api_key or self.api_key
+        group("aemet").do(("bulletin", _digest(api_key)), breaker("aemet").call, self._refresh, api_key)
+        # AEMET ha aceptado la key: pasa a ser la del refresco de fondo
+        with self._lock:
+            self._valid_keys.add(_digest(api_key))
+            self.api_key = api_key
+        self._start_refresher()
+
+    def _refresh(self, api_key: str) -> None:
+        requests.packages.urllib3.disable_warnings()
+        res = http.get(AEMET_AVISOS_URL, params={"api_key": api_key}, verify=False, timeout=10)
+        if res.status_code == 401:
+            raise AemetAuthError("Error: AEMET API Key inválida.")
+        if res.status_code != 200:
+            raise AemetError(f"Error de conexión con AEMET (Status {res.status_code}).")
+        json_res = res.json()
+        if json_res.get("estado") != 200:
+            raise AemetError(f"Error AEMET: {json_res.get('descripcion')}")
+
+        # El boletín se descarga y parsea en streaming, sin cargarlo entero en memoria
+        data_res = http.get(json_res.get("datos"), verify=False, timeout=15, stream=True)
+        with data_res:
+            data_res.raw.decode_content = True
+            self.load(iter_bulletin(data_res.raw))
+
+    def load(self, warnings) -> None:
+        by_zone, by_province, by_area = {}, {}, {}
+        for warning in warnings:
+            by_zone.setdefault(warning.zone, []).append(warning)
+            by_province.setdefault(warning.zone[2:4], []).append(warning)
+            by_area.setdefault(normalize_location(warning.area), []).append(warning)
+        with self._lock:
+            self._by_zone, self._by_province, self._by_area = by_zone, by_province, by_area
+            self.updated_at = time.time()
+
+    def ensure_loaded(self, api_key: str) -> None:
+        """Valida la key de la petición (una vez por key y proceso) y, en la primera consulta,
+        carga el boletín de forma síncrona para no responder con uno vacío. Una key inválida
+        falla solo para quien la usa; el boletín compartido y su refresco no cambian.
+        Después se sirve siempre el último boletín bueno, aunque AEMET esté caída."""
+        digest = _digest(api_key)
+        with self._lock:
+            if digest in self._valid_keys and self.updated_at:
+                return
+            rejected_at = self._invalid_keys.get(digest)
+        if rejected_at is not None and time.time() - rejected_at < INVALID_KEY_TTL:
+            raise AemetAuthError("Error: AEMET API Key inválida.")
+        try:
+            self.refresh(api_key)
+        except AemetAuthError:
+            now = time.time()
+            with self._lock:
+                self._invalid_keys = {k: t for k, t in self._invalid_keys.items() if now - t < INVALID_KEY_TTL}
+                self._invalid_keys[digest] = now
+            raise
+        except Exception:
+            # AEMET no responde: si ya hay boletín, se sirve (la key queda pendiente de validar)
+            if not self.updated_at:
+                raise
+
+    def is_stale(self) -> bool:
+        return time.time() - self.updated_at > 2 * self.refresh_interval
+
+    def lookup(self, location: str):
+        """Avisos vigentes para un código de zona, provincia, comarca, capital o municipio.
+        Devuelve None si el lugar no se puede asociar a ninguna zona: eso no es "sin avisos"."""
+        key = normalize_location(location)
+        zone = location.strip()
+        code = ALIAS_PROVINCIA.get(key) or _PROVINCIA_POR_NOMBRE.get(key)
+        # Código de zona "CCPPZZ": solo dígitos ("Madrid" también tiene 6 letras)
+        is_zone = len(zone) == 6 and zone.isdigit() and zone[2:4] in PROVINCIAS
+        if code is None and is_zone:
+            code = zone[2:4]
+        municipality = None
+        if code is None:
+            # Cualquier otro municipio se resuelve a su zona de avisos con el nomenclátor local
+            gazetteer = get_gazetteer()
+            municipality = gazetteer.resolve(location) if gazetteer is not None else None
+        with self._lock:
+            found = self._by_zone.get(zone) or self._by_area.get(key)
+            if found is None and municipality is not None:
+                found = self._by_zone.get(municipality.zone, [])
+            elif found is None and code is not None:
+                found = self._by_zone.get(zone, []) if is_zone else self._by_province.get(code, [])
+        if found is None:
+            return None
+        now = datetime.now().astimezone()
+        return [w for w in found if w.expires is None or w.expires > now]
+
+
+# Una API key inválida no debe contar como caída del servicio
+breaker("aemet").ignore = (AemetAuthError,)
+
+def _digest(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+_PROVINCIA_POR_NOMBRE = {normalize_location(name): code for code, name in PROVINCIAS.items()}
+
+warnings_store = AemetWarningsStore()
@@ -1,13 +1,11 @@
 import streamlit as st
-import datetime
-import requests
-import xml.etree.ElementTree as ET
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain_core.prompts import PromptTemplate
-from langchain_community.callbacks.streamlit import StreamlitCallbackHandler
-from langchain_core.tools import Tool
-from langchain.memory import ConversationBufferMemory
+
+from chat_memory import TokenBudgetMemory
+from engine import Engine, EngineConfig
+from metrics import registry
+from observations import PromptSizeHandler
+from streaming import FinalAnswerStreamHandler
+from styles import CSS, WELCOME
 
 # --- 1. Configuración de Página y Estilos CSS Premium ---
 st.set_page_config(
@@ -17,306 +15,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Estilos CSS avanzados: Glassmorphism, Neumorphism, Animaciones
-st.markdown("""
-<style>
-    /* Importar fuente futurista */
-    @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@300;500;700&display=swap');
-
-    /* Variables de tema */
-    :root {
-        --primary-color: #00d2ff;
-        --secondary-color: #3a7bd5;
-        --bg-color: #0f172a;
-        --card-bg: rgba(30, 41, 59, 0.7);
-        --text-color: #e2e8f0;
-        --accent: #f59e0b;
-    }
-
-    /* Reset y base */
-    html, body, [class*="css"] {
-        font-family: 'Outfit', sans-serif;
-        color: var(--text-color);
-    }
-    
-    .stApp {
-        background-color: var(--bg-color);
-        background-image: 
-            radial-gradient(at 0% 0%, rgba(58, 123, 213, 0.15) 0px, transparent 50%),
-            radial-gradient(at 100% 100%, rgba(245, 158, 11, 0.1) 0px, transparent 50%);
-        background-attachment: fixed;
-    }
-
-    /* Títulos con gradiente */
-    h1, h2, h3 {
-        background: linear-gradient(90deg, var(--primary-color), var(--secondary-color));
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-weight: 700;
-        letter-spacing: -0.5px;
-    }
-
-    /* Tarjetas Glassmorphism */
-    .glass-card {
-        background: var(--card-bg);
-        backdrop-filter: blur(12px);
-        -webkit-backdrop-filter: blur(12px);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        border-radius: 16px;
-        padding: 20px;
-        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);
-        margin-bottom: 20px;
-        transition: transform 0.2s ease;
-    }
-    .glass-card:hover {
-        transform: translateY(-2px);
-        border-color: rgba(255, 255, 255, 0.2);
-    }
-
-    /* Sidebar personalizado */
-    section[data-testid="stSidebar"] {
-        background-color: #0a0e17;
-        border-right: 1px solid rgba(255,255,255,0.05);
-    }
-
-    /* Chat Messages */
-    .stChatMessage {
-        background: transparent;
-        border: none;
-    }
-    [data-testid="stChatMessageContent"] {
-        background: rgba(255, 255, 255, 0.05);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        border-radius: 12px;
-        padding: 15px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    /* Input de chat estilizado */
-    .stChatInputContainer {
-        padding-bottom: 20px;
-    }
-    .stChatInputContainer input {
-        background: rgba(15, 23, 42, 0.8) !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-        color: white !important;
-        border-radius: 24px !important;
-    }
-    
-    /* Ocultar elementos default de Streamlit */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    .stDeployButton {display:none;}
-    
-    /* Animación de carga sutil para el spinner */
-    .stSpinner > div {
-        border-top-color: var(--primary-color) !important;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# --- 2. Funciones Lógicas (Backend) ---
-
-def get_current_time(query: str = "") -> str:
-    """Devuelve la fecha y hora actual exacta. Úsala cuando pregunten 'qué hora es' o 'qué día es hoy'."""
-    now = datetime.datetime.now()
-    return now.strftime("%Y-%m-%d %H:%M:%S")
-
-def get_weather(location: str) -> str:
-    """Obtiene el clima actual y pronóstico para una ciudad usando Open-Meteo API.
-    Devuelve un string detallado con temperatura, viento y máximas/mínimas."""
-    try:
-        # 1. Geocoding
-        # Limpiamos la location para evitar caracteres raros
-        location = location.strip()
-        geo_url = f"https://geocoding-api.open-meteo.com/v1/search?name={location}&count=1&language=es&format=json"
-        
-        try:
-            geo_res = requests.get(geo_url, timeout=5).json()
-        except Exception:
-            return f"Error de conexión al buscar la ubicación '{location}'."
-
-        if not geo_res.get("results"):
-            return f"No encontré la ubicación '{location}'. Por favor verifica el nombre."
-            
-        lat = geo_res["results"][0]["latitude"]
-        lon = geo_res["results"][0]["longitude"]
-        name = geo_res["results"][0]["name"]
-        country = geo_res["results"][0].get("country", "")
-        
-        # 2. Weather Data
-        weather_url = (
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-            "&current=temperature_2m,relative_humidity_2m,apparent_temperature,weather_code,wind_speed_10m"
-            "&daily=weather_code,temperature_2m_max,temperature_2m_min,sunrise,sunset"
-            "&timezone=auto"
-        )
-        
-        try:
-            weather_res = requests.get(weather_url, timeout=5).json()
-        except Exception:
-            return "Error conectando con el servicio de clima."
-        
-        current = weather_res.get("current", {})
-        daily = weather_res.get("daily", {})
-        current_units = weather_res.get("current_units", {})
-        
-        # Datos Actuales
-        temp = current.get("temperature_2m", "N/A")
-        feels_like = current.get("apparent_temperature", "N/A")
-        humidity = current.get("relative_humidity_2m", "N/A")
-        wind = current.get("wind_speed_10m", "N/A")
-        
-        # Datos Diarios (Hoy)
-        if daily and 'temperature_2m_max' in daily:
-            max_temp = daily['temperature_2m_max'][0]
-            min_temp = daily['temperature_2m_min'][0]
-            sunrise = daily.get('sunrise', [''])[0][-5:] # Solo la hora
-            sunset = daily.get('sunset', [''])[0][-5:]
-        else:
-            max_temp = min_temp = sunrise = sunset = "N/A"
-
-        # Formateo de respuesta estructurada para el LLM
-        report = (
-            f"📍 **Informe Climático para {name}, {country}**\n"
-            f"🌡️ **Actual:** {temp}{current_units.get('temperature_2m','°C')} (Sensación: {feels_like}°)\n"
-            f"💧 **Humedad:** {humidity}%\n"
-            f"💨 **Viento:** {wind} km/h\n"
-            f"📅 **Pronóstico Hoy:** Máx {max_temp}° / Mín {min_temp}°\n"
-            f"☀️ **Sol:** Sale {sunrise} / Pone {sunset}\n"
-        )
-        return report
-
-    except Exception as e:
-        return f"Ocurrió un error inesperado al obtener el clima: {str(e)}"
+st.markdown(CSS, unsafe_allow_html=True)
 
-def search_func(query: str) -> str:
-    """Busca en internet usando DuckDuckGo como fallback."""
-    try:
-        from duckduckgo_search import DDGS
-        with DDGS() as ddgs:
-            # Intentamos backend 'lite' que suele ser más rápido/estable
-            results = list(ddgs.text(query, max_results=3, backend="lite"))
-            if results:
-                summary = "\n".join([f"- {r['title']}: {r['body']}" for r in results])
-                return f"Resultados de búsqueda:\n{summary}"
-        return "No encontré información relevante en la búsqueda rápida."
-    except Exception as e:
-        return f"Error en búsqueda web: {str(e)}"
+# --- 2. Motor del Agente (herramientas en tools.py, prompt y turno en engine.py) ---
 
-def check_aemet_alerts(location: str) -> str:
-    """Verifica alertas oficiales de AEMET. Requiere API Key en configuración."""
-    
-    # Recuperamos la key del estado de sesión si no se pasa explícitamente (el agente no pasa keys)
-    api_key = st.session_state.get("aemet_api_key", "")
-    
-    if not api_key:
-        return f"⚠️ No tengo configurarada la API Key de AEMET. Buscando noticias recientes sobre alertas en {location}...\n" + search_func(f"Alertas meteorológicas AEMET {location} última hora")
-
-    try:
-        requests.packages.urllib3.disable_warnings() 
-        # Endpoint de avisos de hoy
-        url = "https://opendata.aemet.es/opendata/api/avisos_de_fenomenos_meteorologicos_adversos/archivo/hoy"
-        
-        # 1. Obtener URL de datos
-        res = requests.get(url, params={"api_key": api_key}, verify=False, timeout=10)
-        
-        if res.status_code == 200:
-            json_res = res.json()
-            if json_res.get("estado") == 200:
-                data_url = json_res.get("datos")
-                # 2. Descargar datos reales
-                data_res = requests.get(data_url, verify=False, timeout=15)
-                data_res.encoding = 'iso-8859-15' # AEMET suele usar esta codificación o utf-8
-                content = data_res.text
-                
-                # Búsqueda simple en el texto raw (podría mejorarse parseando JSON si AEMET lo devuelve estructurado ahí, pero a veces es XML/TXT)
-                # El endpoint 'archivo/hoy' suele devolver un JSON grande con lista de avisos.
-                
-                # Intentamos parsear si es json
-                try:
-                    alerts_data = data_res.json()
-                    # Si es una lista de avisos, filtramos
-                    relevant_alerts = []
-                    # Esta lógica depende mucho de la estructura exacta de AEMET que es compleja
-                    # Haremos un escaneo de texto simple para robustez inmediata
-                    if location.lower() in str(alerts_data).lower():
-                         return f"🚨 **ALERTA DETECTADA EN AEMET** para la región de {location}. Se recomienda precaución. Consulta la web oficial para detalles específicos."
-                    else:
-                        return f"✅ No se detectan avisos específicos mencinando '{location}' en el boletín de hoy de AEMET."
-                except:
-                    # Fallback texto
-                    if location.lower() in content.lower():
-                        return f"🚨 Mención encontrada en boletín AEMET para {location}. Posible alerta."
-                    else:
-                         return f"Info AEMET consultada. No parece haber alertas graves mencionando explícitamente {location}."
-            else:
-                return f"Error AEMET: {json_res.get('descripcion')}"
-        elif res.status_code == 401:
-            return "Error: AEMET API Key inválida."
-        else:
-            return f"Error de conexión con AEMET (Status {res.status_code})."
-
-    except Exception as e:
-        return search_func(f"Alertas clima {location}")
-
-# --- 3. Definición de Herramientas y Agente ---
-
-tools = [
-    Tool(
-        name="get_current_time",
-        func=get_current_time,
-        description="Usa esto para obtener la fecha y hora actual. Input: string vacío."
-    ),
-    Tool(
-        name="get_weather",
-        func=get_weather,
-        description="Usa esto para obtener el clima actual y pronóstico. Input: nombre de la ciudad (ej: 'Madrid')."
-    ),
-    Tool(
-        name="check_aemet_alerts",
-        func=check_aemet_alerts,
-        description="Usa esto SOLO para verificar alertas de seguridad oficiales en España (AEMET). Input: nombre de la ciudad/región."
-    )
-]
-
-# Prompt mejorado con "Persona" y "Memoria"
-template = """Eres 'Meteorolog.IA', una asistente experta en meteorología y clima, profesional pero amable y con un toque futurista.
-
-Tu objetivo es dar información climática precisa y útil.
-1. SIEMPRE usa las herramientas si te preguntan por datos reales (clima, hora, alertas). No inventes.
-2. Si el usuario saluda, responde amablemente y ofrece tu ayuda.
-3. Si detectas una alerta o clima peligroso, da recomendaciones de seguridad.
-4. Usa formato Markdown atractivo (negritas, emojis) en tu respuesta final.
-5. Piensa paso a paso.
-
-Historial de conversación:
-{chat_history}
-
-Pregunta del usuario: {input}
-
-Herramientas disponibles:
-{tools}
+@st.cache_resource(show_spinner=False)
+def get_engine() -> Engine:
+    """Motor compartido por reruns y sesiones: LLMs y AgentExecutors cacheados por config.
+    La memoria sigue siendo por sesión (st.session_state)."""
+    engine = Engine(verbose=True)
+    # langchain.agents, el cliente de Gemini y el callback de Streamlit se cargan en segundo
+    # plano mientras el usuario escribe
+    engine.warm_up()
+    return engine
 
-Usa el siguiente formato:
+# Fuera del chat_input: el warm-up arranca en la primera carga de la página, no en el primer turno
+engine = get_engine()
 
-Question: la pregunta del usuario
-Thought: piensa qué hacer (verificar historial, usar herramienta, o responder directo)
-Action: la herramienta a usar (una de [{tool_names}])
-Action Input: el input para la herramienta
-Observation: el resultado de la herramienta
-... (repite Thought/Action/Observation si es necesario)
-Thought: ya tengo la respuesta final
-Final Answer: la respuesta final al usuario
-
-Begin!
-
-Question: {input}
-Thought:{agent_scratchpad}"""
-
-prompt = PromptTemplate.from_template(template)
-
-# --- 4. Interfaz de Usuario (Sidebar & Main) ---
+# --- 3. Interfaz de Usuario (Sidebar & Main) ---
 
 with st.sidebar:
     st.markdown("<div style='text-align: center;'><h1>🌪️ Meteorolog.IA</h1></div>", unsafe_allow_html=True)
@@ -338,27 +54,68 @@ with st.sidebar:
         model_options = ["gemini-2.5-flash", "gemini-1.5-flash", "gemini-1.5-pro"]
         selected_model = st.selectbox("Versión del Modelo", model_options, index=0)
         temperature = st.slider("Creatividad", 0.0, 1.0, 0.0)
+        memory_budget = st.slider("Presupuesto de memoria (tokens)", 500, 8000, 2000, step=250)
+        stream_answer = st.toggle("Mostrar la respuesta mientras se genera", value=True)
+        compact_observations = st.toggle("Observaciones compactas para el LLM", value=True)
+        show_diagnostics = st.toggle("Panel de diagnóstico", value=False)
 
     st.markdown("---")
     st.info("💡 **Pro Tip:** Prueba preguntar '¿Hay alertas en Valencia hoy?' o '¿Qué tiempo hará mañana en Barcelona?'")
     
     # Botón de reset memoria
     if st.button("🗑️ Borrar Memoria"):
-        st.session_state.memory = ConversationBufferMemory(memory_key="chat_history")
+        st.session_state.pop("memory", None)
         st.session_state.messages = []
         st.rerun()
 
-# --- 5. Lógica Principal del Chat ---
+    # Métricas de tamaño del historial que se inyecta en el prompt
+    if "memory" in st.session_state:
+        mem_stats = st.session_state.memory.prompt_metrics()
+        st.caption(
+            f"🧠 Memoria: {mem_stats['prompt_tokens']} tokens en el prompt "
+            f"({mem_stats['saved_tokens']} ahorrados) · {mem_stats['verbatim_turns']}/{mem_stats['turns']} turnos literales"
+        )
+
+    # Latencias (p50/p95/p99) de LLM, herramientas y upstreams, y ratios de caché (ver metrics.py)
+    if show_diagnostics:
+        with st.expander("🔬 Diagnóstico", expanded=True):
+            snapshot = registry.snapshot()
+            rows = [
+                {
+                    "métrica": h["name"],
+                    "etiquetas": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+                    "n": h["count"],
+                    "p50": round(h["p50"], 3),
+                    "p95": round(h["p95"], 3),
+                    "p99": round(h["p99"], 3),
+                }
+                for h in snapshot["histograms"] if h["count"]
+            ]
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+            else:
+                st.caption("Aún no hay medidas.")
+            for g in snapshot["gauges"]:
+                labels = ", ".join(f"{k}={v}" for k, v in g["labels"].items())
+                st.caption(f"{g['name']} ({labels}): {g['value']:.3g}")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("Prometheus", registry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+            with col2:
+                st.download_button("JSON lines", registry.to_json_lines(), file_name="metrics.jsonl", mime="application/json")
+
+# --- 4. Lógica Principal del Chat ---
 
 # Inicializar historial visual
 if "messages" not in st.session_state:
     st.session_state.messages = [
-        {"role": "assistant", "content": "¡Hola! Soy **Meteorolog.IA**. 🌩️\nEstoy conectada a satélites y estaciones en tiempo real.\n¿En qué ciudad te encuentras hoy?"}
+        {"role": "assistant", "content": WELCOME}
     ]
 
-# Inicializar Memoria de LangChain
+# Inicializar Memoria (últimos turnos literales + resumen, acotada por tokens)
 if "memory" not in st.session_state:
-    st.session_state.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    st.session_state.memory = TokenBudgetMemory(max_tokens=memory_budget)
+st.session_state.memory.max_tokens = memory_budget
 
 # Renderizar mensajes anteriores
 for msg in st.session_state.messages:
@@ -381,39 +138,40 @@ if user_input := st.chat_input("Escribe tu consulta climática..."):
     # 2. Procesar con Agente
     with st.chat_message("assistant", avatar="🌪️"):
         status_container = st.status("🛰️ Procesando datos satelitales...", expanded=True)
+        # La respuesta va fuera del status para que se vea mientras el agente aún trabaja
+        answer_container = st.empty()
         try:
-            # Callback para ver el pensamiento en el expander
-            st_cb = StreamlitCallbackHandler(status_container)
-            
-            # Inicializar LLM y Agente (Re-creado para actualizarse con config)
-            llm = ChatGoogleGenerativeAI(
-                model=selected_model,
+            memory = st.session_state.memory
+            turn_report = None
+            config = EngineConfig(
                 google_api_key=google_api_key,
-                temperature=temperature
-            )
-            
-            # Crear Agente con Memoria
-            # NOTA: create_react_agent estándar no inyecta memoria automáticamente en agent_scratchpad
-            # Usamos AgentExecutor para manejar la memoria
-            agent = create_react_agent(llm, tools, prompt)
-            
-            agent_executor = AgentExecutor(
-                agent=agent,
-                tools=tools,
-                verbose=True,
-                memory=st.session_state.memory, # AQUÍ está la clave de la memoria 🧠
-                handle_parsing_errors=True
+                aemet_api_key=st.session_state.aemet_api_key,
+                model=selected_model,
+                temperature=temperature,
+                compact_observations=compact_observations,
+                memory_budget=memory_budget,
             )
             
-            response = agent_executor.invoke(
-                {"input": user_input},
-                {"callbacks": [st_cb]}
-            )
+            # Callback para ver el pensamiento en el expander (+ recuento de tokens de prompt).
+            # Import perezoso: langchain_community no entra en el arranque (lo precarga Engine.warm_up)
+            from langchain_community.callbacks.streamlit import StreamlitCallbackHandler
+            prompt_size = PromptSizeHandler()
+            callbacks = [StreamlitCallbackHandler(status_container), prompt_size]
+            if stream_answer:
+                # ...y otro que escribe el "Final Answer" token a token según llega
+                callbacks.append(FinalAnswerStreamHandler(answer_container))
             
-            output_text = response["output"]
+            # Fast-path del router o ciclo ReAct con el executor compartido; la memoria de la
+            # sesión se pasa en cada turno (ver engine.py)
+            result = engine.answer(user_input, memory, config, callbacks=callbacks)
+            output_text = result["answer"]
+            if result["path"] == "agent":
+                turn_report = prompt_size.summary()
             
             status_container.update(label="✅ Análisis Global Completado", state="complete", expanded=False)
-            st.markdown(output_text)
+            answer_container.markdown(output_text)
+            if turn_report:
+                st.caption(turn_report)
             
             # Guardar en historial visual
             st.session_state.messages.append({"role": "assistant", "content": output_text})
@@ -0,0 +1,601 @@
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# --- Benchmark offline de extremo a extremo ---
+# Levanta en local dobles de Open-Meteo (geocoding + forecast), AEMET (metadatos + 'datos')
+# y DuckDuckGo con latencia y errores configurables, y un LLM guionizado que emite pasos
+# ReAct. Mide get_weather, check_aemet_alerts y search_func en frío y en caliente, turnos
+# completos del AgentExecutor y el rendimiento con N sesiones concurrentes, y escribe un
+# informe JSON. Sin red: sirve para detectar regresiones y comprobar que cachés y pools rinden.
+#
+# Uso: python benchmark.py --iterations 20 --sessions 1,4,16 --output bench_report.json
+
+# (nombre, país, lat, lon, código INE, habitantes, zona AEMET); los extranjeros solo están en el geocoder
+PLACES = [
+    ("Madrid", "España", 40.4168, -3.7038, 28079, 3300000, "722802"),
+    ("Barcelona", "España", 41.3874, 2.1686, 8019, 1620000, "610801"),
+    ("Valencia", "España", 39.4699, -0.3763, 46250, 800000, "774602"),
+    ("Sevilla", "España", 37.3891, -5.9845, 41091, 685000, "614102"),
+    ("Zaragoza", "España", 41.6488, -0.8891, 50297, 675000, "625002"),
+    ("Málaga", "España", 36.7213, -4.4214, 29067, 580000, "612902"),
+    ("Murcia", "España", 37.9922, -1.1307, 30030, 460000, "773002"),
+    ("Bilbao", "España", 43.2630, -2.9350, 48020, 345000, "694803"),
+    ("Valladolid", "España", 41.6523, -4.7245, 47186, 298000, "654703"),
+    ("Vigo", "España", 42.2406, -8.7207, 36057, 293000, "713602"),
+    ("París", "Francia", 48.8566, 2.3522, 0, 0, ""),
+    ("Lisboa", "Portugal", 38.7223, -9.1393, 0, 0, ""),
+    ("Londres", "Reino Unido", 51.5074, -0.1278, 0, 0, ""),
+]
+
+DEFAULT_LATENCY_MS = {"open-meteo": 60, "aemet": 400, "search": 250}
+DEFAULT_ERROR_RATE = {"open-meteo": 0.0, "aemet": 0.0, "search": 0.0}
+
+CAP = "urn:oasis:names:tc:emergency:cap:1.2"
+
+
+def _parse_map(text: str, defaults: dict, cast=float) -> dict:
+    """'aemet=300,search=100' -> dict sobre los valores por defecto."""
+    values = dict(defaults)
+    for item in filter(None, (text or "").split(",")):
+        name, _, value = item.partition("=")
+        values[name.strip()] = cast(value)
+    return values
+
+
+def load_places(path: str = None) -> list:
+    """Tabla de lugares de los dobles: la de serie o una grabada en JSON (lista de listas como PLACES)."""
+    if not path:
+        return PLACES
+    with open(path, encoding="utf-8") as f:
+        return [tuple(row) for row in json.load(f)]
+
+
+# --- Dobles de los upstreams ---
+
+class MockUpstreams:
+    """Respuestas deterministas con el formato real de cada API, más latencia (log-normal
+    con mediana configurable) y errores inyectados por upstream."""
+
+    def __init__(self, places, latency_ms=None, error_rate=None, jitter: float = 0.4,
+                 bulletin_docs: int = 300, seed: int = 7):
+        self.places = places
+        self.by_name = {p[0].lower(): p for p in places}
+        self.latency_ms = latency_ms or DEFAULT_LATENCY_MS
+        self.error_rate = error_rate or DEFAULT_ERROR_RATE
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = {}
+        self._requests_lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self.bulletin = self._build_bulletin(bulletin_docs)
+        self.base_url = ""
+
+    # Infraestructura
+
+    def _draw(self, upstream: str):
+        with self._rng_lock:
+            median = self.latency_ms.get(upstream, 0) / 1000
+            delay = median * math.exp(self._rng.gauss(0, self.jitter)) if median else 0.0
+            failed = self._rng.random() < self.error_rate.get(upstream, 0.0)
+        return delay, failed
+
+    def _count(self, route: str) -> None:
+        with self._requests_lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def handle(self, request, path: str, query: dict) -> None:
+        upstream, route = self._route(path)
+        self._count(route)
+        if route == "unknown":
+            return _reply(request, 404, {"error": "not found"})
+        delay, failed = self._draw(upstream)
+        time.sleep(delay)
+        if failed:
+            # DuckDuckGo limita con un 202 "Ratelimit"; el resto falla con 503
+            return _reply(request, 202 if upstream == "search" else 503, {"error": "injected"})
+        return getattr(self, "_" + route)(request, query)
+
+    @staticmethod
+    def _route(path: str):
+        routes = {
+            "/v1/search": ("open-meteo", "geocoding"),
+            "/v1/forecast": ("open-meteo", "forecast"),
+            "/aemet/avisos": ("aemet", "aemet_metadata"),
+            "/aemet/municipios": ("aemet", "municipios_metadata"),
+            "/aemet/datos/avisos.tar": ("aemet", "aemet_datos"),
+            "/aemet/datos/municipios.json": ("aemet", "municipios_datos"),
+            "/search": ("search", "search"),
+        }
+        return routes.get(path, ("", "unknown"))
+
+    # Open-Meteo
+
+    def _geocoding(self, request, query):
+        place = self.by_name.get(query.get("name", "").strip().lower())
+        if place is None:
+            return _reply(request, 200, {"generationtime_ms": 0.3})
+        name, country, lat, lon = place[:4]
+        return _reply(request, 200, {"results": [{"name": name, "country": country, "latitude": lat, "longitude": lon}]})
+
+    def _forecast(self, request, query):
+        lats = [float(v) for v in query.get("latitude", "0").split(",")]
+        lons = [float(v) for v in query.get("longitude", "0").split(",")]
+        items = [self._forecast_item(lat, lon, query) for lat, lon in zip(lats, lons)]
+        return _reply(request, 200, items[0] if len(items) == 1 else items)
+
+    def _forecast_item(self, lat: float, lon: float, query: dict) -> dict:
+        rng = random.Random(f"{lat:.2f},{lon:.2f}")
+        base = 14 + (42 - lat) * 0.8 + rng.uniform(-2, 2)
+        offset = 7200
+        local_now = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=offset)
+        midnight = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+        days = int(query.get("forecast_days", 7))
+
+        def value(var, hour, day_rng):
+            temp = base + 6 * math.sin((hour % 24 - 9) / 24 * 2 * math.pi)
+            if var in ("temperature_2m", "apparent_temperature"):
+                return round(temp - (1 if var == "apparent_temperature" else 0), 1)
+            if var == "relative_humidity_2m":
+                return 55 + day_rng.randint(0, 30)
+            if var == "wind_speed_10m":
+                return round(day_rng.uniform(3, 25), 1)
+            if var in ("precipitation_probability", "precipitation_probability_max"):
+                return day_rng.choice((0, 5, 10, 20, 40, 70, 90))
+            if var in ("precipitation", "precipitation_sum"):
+                return round(max(0.0, day_rng.gauss(0.2, 1.0)), 1)
+            if var == "weather_code":
+                return day_rng.choice((0, 1, 2, 3, 61, 80))
+            if var == "temperature_2m_max":
+                return round(base + 6, 1)
+            if var == "temperature_2m_min":
+                return round(base - 6, 1)
+            return 0
+
+        item = {"latitude": lat, "longitude": lon, "timezone": "Europe/Madrid", "utc_offset_seconds": offset}
+        current = [v for v in query.get("current", "").split(",") if v]
+        if current:
+            item["current"] = {"time": local_now.strftime("%Y-%m-%dT%H:%M"), **{v: value(v, local_now.hour, rng) for v in current}}
+            item["current_units"] = {"temperature_2m": "°C"}
+        daily = [v for v in query.get("daily", "").split(",") if v]
+        if daily:
+            dates = [midnight + timedelta(days=d) for d in range(days)]
+            item["daily"] = {"time": [d.strftime("%Y-%m-%d") for d in dates]}
+            for var in daily:
+                if var in ("sunrise", "sunset"):
+                    item["daily"][var] = [d.strftime("%Y-%m-%dT") + ("08:05" if var == "sunrise" else "19:10") for d in dates]
+                else:
+                    item["daily"][var] = [value(var, 12, rng) for _ in dates]
+            item["daily_units"] = {"temperature_2m_max": "°C"}
+        hourly = [v for v in query.get("hourly", "").split(",") if v]
+        if hourly:
+            hours = [midnight + timedelta(hours=h) for h in range(24 * days)]
+            item["hourly"] = {"time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours]}
+            for var in hourly:
+                item["hourly"][var] = [value(var, h.hour, rng) for h in hours]
+            item["hourly_units"] = {"temperature_2m": "°C"}
+        return item
+
+    # AEMET
+
+    def _aemet_metadata(self, request, query):
+        return _reply(request, 200, {"descripcion": "exito", "estado": 200, "datos": self.base_url + "/aemet/datos/avisos.tar"})
+
+    def _municipios_metadata(self, request, query):
+        return _reply(request, 200, {"descripcion": "exito", "estado": 200, "datos": self.base_url + "/aemet/datos/municipios.json"})
+
+    def _aemet_datos(self, request, query):
+        return _reply(request, 200, self.bulletin, content_type="application/x-tar")
+
+    def _municipios_datos(self, request, query):
+        rows = [
+            {"id": f"id{ine:05d}", "nombre": name, "latitud_dec": str(lat), "longitud_dec": str(lon),
+             "num_hab": str(pop), "zona_comarcal": zone}
+            for name, country, lat, lon, ine, pop, zone in self.places if zone
+        ]
+        return _reply(request, 200, rows)
+
+    def _build_bulletin(self, docs: int) -> bytes:
+        """Tar con un CAP por zona: aviso amarillo en la mitad de los lugares y relleno en verde
+        (que el parser descarta) hasta `docs` documentos, como el boletín nacional."""
+        onset = (self.started_at - timedelta(hours=1)).isoformat(timespec="seconds")
+        expires = (self.started_at + timedelta(days=1)).isoformat(timespec="seconds")
+        zones = [(zone, f"Zona de {name}", "amarillo") for name, *_, zone in self.places[::2] if zone]
+        zones += [(f"99{i % 52 + 1:02d}{i:02d}"[:6], f"Zona {i}", "verde") for i in range(max(0, docs - len(zones)))]
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as archive:
+            for i, (zone, area, level) in enumerate(zones):
+                xml = (
+                    f'<?xml version="1.0" encoding="UTF-8"?><alert xmlns="{CAP}"><identifier>bench-{i}</identifier>'
+                    f"<info><language>es-ES</language><event>Aviso de lluvias</event>"
+                    f"<onset>{onset}</onset><expires>{expires}</expires>"
+                    f"<parameter><valueName>AEMET-Meteoalerta nivel</valueName><value>{level}</value></parameter>"
+                    f"<parameter><valueName>AEMET-Meteoalerta fenomeno</valueName><value>PR;Lluvias</value></parameter>"
+                    f"<area><areaDesc>{area}</areaDesc><polygon>{' '.join('40.0,-3.0' for _ in range(40))}</polygon>"
+                    f"<geocode><valueName>AEMET-Meteoalerta zona</valueName><value>{zone}</value></geocode></area>"
+                    f"</info></alert>"
+                ).encode()
+                info = tarfile.TarInfo(f"Z_CAP_C_LEMM_{i:04d}.xml")
+                info.size = len(xml)
+                archive.addfile(info, io.BytesIO(xml))
+        return buffer.getvalue()
+
+    # DuckDuckGo
+
+    def _search(self, request, query):
+        q = query.get("q", "")
+        n = int(query.get("max_results", 3))
+        results = [{"title": f"{q} ({i + 1})", "href": f"https://example.org/{i}", "body": f"Resultado {i + 1} para {q}."} for i in range(n)]
+        return _reply(request, 200, results)
+
+
+def _reply(request, status: int, body, content_type: str = "application/json") -> None:
+    data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode()
+    request.send_response(status)
+    request.send_header("Content-Type", content_type)
+    request.send_header("Content-Length", str(len(data)))
+    request.end_headers()
+    request.wfile.write(data)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 con keep-alive: el pool de http_client reutiliza conexiones como con los upstreams reales
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.server.upstreams.handle(self, url.path, query)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(upstreams: MockUpstreams) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.upstreams = upstreams
+    upstreams.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="mock-upstreams", daemon=True).start()
+    return server
+
+
+class MockSearchClient:
+    """Sustituto de DDGS que consulta el doble local a través del cliente HTTP compartido."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def text(self, query: str, max_results: int = 3, backend: str = "api"):
+        from http_client import http
+        res = http.get(self.base_url + "/search", params={"q": query, "max_results": max_results, "backend": backend}, timeout=5)
+        if res.status_code == 202:
+            raise RuntimeError("202 Ratelimit")
+        res.raise_for_status()
+        return res.json()
+
+
+def wire_upstreams(base_url: str) -> None:
+    """Redirige los módulos del proyecto a los dobles locales."""
+    import aemet
+    import forecast
+    import gazetteer
+    import geocoding
+    from search import web_search
+
+    geocoding.GEOCODING_URL = base_url + "/v1/search"
+    forecast.FORECAST_URL = base_url + "/v1/forecast"
+    aemet.AEMET_AVISOS_URL = base_url + "/aemet/avisos"
+    gazetteer.MUNICIPIOS_URL = base_url + "/aemet/municipios"
+    client = MockSearchClient(base_url)
+    web_search._client = lambda: client
+
+
+def clear_caches() -> None:
+    """Estado frío: sin pronósticos, geocoding, búsquedas ni boletín en memoria."""
+    from aemet import warnings_store
+    from forecast import forecast_cache
+    from geocoding import geocoding_cache
+    from search import web_search
+
+    forecast_cache.clear()
+    geocoding_cache.clear()
+    web_search.clear()
+    warnings_store.updated_at = 0.0
+
+
+# --- LLM guionizado ---
+
+def make_scripted_llm(scripts: dict, latency_ms: float = 0.0, jitter: float = 0.3, seed: int = 11):
+    """LLM falso que sigue un guion por pregunta: una Action por paso y, al acabar, Final Answer."""
+    from langchain_core.language_models.llms import LLM
+
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class ScriptedReActLLM(LLM):
+        @property
+        def _llm_type(self) -> str:
+            return "scripted-react"
+
+        def _call(self, prompt: str, stop=None, run_manager=None, **kwargs) -> str:
+            if latency_ms:
+                with rng_lock:
+                    delay = latency_ms / 1000 * math.exp(rng.gauss(0, jitter))
+                time.sleep(delay)
+            # El scratchpad va tras la última "Question:"; cada Observation es un paso ya hecho
+            tail = prompt.rsplit("Question:", 1)[-1]
+            question = tail.split("\n", 1)[0].strip()
+            steps = scripts.get(question, [])
+            done = tail.count("Observation:")
+            if done < len(steps):
+                tool, tool_input = steps[done]
+                return f" Necesito datos reales.\nAction: {tool}\nAction Input: {tool_input}"
+            observation = tail.rsplit("Observation:", 1)[-1].strip()[:200] if done else "¡Hola!"
+            return f" Ya tengo la respuesta final\nFinal Answer: {observation}"
+
+    return ScriptedReActLLM()
+
+
+def build_scenarios(places) -> list:
+    """Preguntas con su guion de herramientas: (pregunta, [(herramienta, input), ...])."""
+    names = [p[0] for p in places]
+    spanish = [p[0] for p in places if p[6]]
+    scenarios = []
+    for i, name in enumerate(names):
+        other = names[(i + 3) % len(names)]
+        scenarios.append((f"¿Qué tiempo hace en {name}?", [("get_weather", name)]))
+        scenarios.append((f"¿Lloverá en {name} el fin de semana?", [("get_forecast", f"{name} | fin de semana")]))
+        scenarios.append((f"Compara {name} y {other}", [("get_weather_multi", f"{name}, {other}")]))
+    for name in spanish:
+        scenarios.append((f"¿Hay avisos en {name}?", [("check_aemet_alerts", name)]))
+        scenarios.append((f"Clima y avisos en {name}", [("run_parallel", f"get_weather: {name}; check_aemet_alerts: {name}")]))
+    return scenarios
+
+
+# --- Medidas ---
+
+def summarize(samples: list) -> dict:
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pct(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "mean_ms": round(1000 * sum(ordered) / len(ordered), 2),
+        "p50_ms": round(1000 * pct(0.50), 2),
+        "p95_ms": round(1000 * pct(0.95), 2),
+        "p99_ms": round(1000 * pct(0.99), 2),
+        "min_ms": round(1000 * ordered[0], 2),
+        "max_ms": round(1000 * ordered[-1], 2),
+    }
+
+
+def _timed(fn, *args) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def check_alert_lookups(places) -> list:
+    """Comprobaciones de corrección sobre el boletín simulado: cada lugar con aviso lo ve por
+    nombre y por código de zona, y ninguno se queda sin resolver. Devuelve los fallos."""
+    from aemet import warnings_store
+
+    warned = {zone for name, *_, zone in places[::2] if zone}
+    problems = []
+    for name, *_, zone in places:
+        if not zone:
+            continue
+        for query in (name, zone):
+            found = warnings_store.lookup(query)
+            if found is None:
+                problems.append(f"lookup({query!r}) no resuelve la zona {zone}")
+            elif zone in warned and not found:
+                problems.append(f"lookup({query!r}) no ve el aviso de la zona {zone}")
+    return problems
+
+
+def bench_tools(places, iterations: int, aemet_key: str) -> dict:
+    """Latencia de get_weather, check_aemet_alerts y search_func, en frío (cachés vacías antes
+    de cada llamada) y en caliente (misma consulta repetida)."""
+    from tools import check_aemet_alerts, get_weather, search_func
+
+    spanish = [p[0] for p in places if p[6]]
+    cases = {
+        "get_weather": (get_weather, [p[0] for p in places]),
+        "check_aemet_alerts": (lambda loc: check_aemet_alerts(loc, api_key=aemet_key), spanish),
+        "search_func": (search_func, [f"alertas meteorológicas {p[0]}" for p in places]),
+    }
+    results = {}
+    for name, (fn, inputs) in cases.items():
+        cold, warm, errors = [], [], 0
+        for i in range(iterations):
+            arg = inputs[i % len(inputs)]
+            clear_caches()
+            elapsed, out = _timed(fn, arg)
+            cold.append(elapsed)
+            errors += out.startswith(("Error", "Ocurrió"))
+            elapsed, out = _timed(fn, arg)
+            warm.append(elapsed)
+        results[name] = {"cold": summarize(cold), "warm": summarize(warm), "errors": errors}
+    return results
+
+
+def _agent_turn(executor, memory, question: str, callbacks) -> float:
+    history = memory.load_memory_variables({})[memory.memory_key]
+    start = time.perf_counter()
+    response = executor.invoke({"input": question, "chat_history": history}, {"callbacks": callbacks})
+    elapsed = time.perf_counter() - start
+    memory.save_context({"input": question}, {"output": response["output"]})
+    return elapsed
+
+
+def bench_agent(executor, scenarios, turns: int) -> dict:
+    """Turnos completos del AgentExecutor (LLM guionizado + herramientas reales), en serie."""
+    from chat_memory import TokenBudgetMemory
+    from instrumentation import InstrumentationHandler
+
+    memory = TokenBudgetMemory()
+    samples, iterations = [], []
+    for i in range(turns):
+        question = scenarios[i % len(scenarios)][0]
+        handler = InstrumentationHandler("scripted")
+        samples.append(_agent_turn(executor, memory, question, [handler]))
+        iterations.append(handler.iterations)
+    return {"latency": summarize(samples), "avg_iterations": sum(iterations) / len(iterations) if iterations else 0}
+
+
+def bench_concurrency(executor, scenarios, levels, turns_per_session: int, seed: int) -> list:
+    """N sesiones a la vez, cada una con su memoria, empezando con cachés frías: rendimiento
+    (turnos/s) y distribución de latencias por nivel de concurrencia."""
+    from chat_memory import TokenBudgetMemory
+    from instrumentation import InstrumentationHandler
+
+    report = []
+    for sessions in levels:
+        clear_caches()
+        samples, errors = [], []
+        lock = threading.Lock()
+
+        def run_session(index):
+            rng = random.Random(seed + index)
+            memory = TokenBudgetMemory()
+            for _ in range(turns_per_session):
+                question = rng.choice(scenarios)[0]
+                try:
+                    elapsed = _agent_turn(executor, memory, question, [InstrumentationHandler("scripted")])
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    samples.append(elapsed)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(run_session, range(sessions)))
+        wall = time.perf_counter() - start
+        report.append({
+            "sessions": sessions,
+            "turns": len(samples),
+            "errors": len(errors),
+            "wall_s": round(wall, 3),
+            "throughput_turns_per_s": round(len(samples) / wall, 2) if wall else None,
+            "latency": summarize(samples),
+        })
+    return report
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark offline de Meteorolog.IA con upstreams simulados.")
+    parser.add_argument("--iterations", type=int, default=20, help="llamadas por herramienta y modo (frío/caliente)")
+    parser.add_argument("--turns", type=int, default=20, help="turnos del agente en serie")
+    parser.add_argument("--sessions", default="1,4,16", help="niveles de concurrencia, separados por comas")
+    parser.add_argument("--turns-per-session", type=int, default=5)
+    parser.add_argument("--latency", default="", help="mediana en ms por upstream, ej. 'open-meteo=60,aemet=400,search=250'")
+    parser.add_argument("--errors", default="", help="tasa de error por upstream, ej. 'aemet=0.1'")
+    parser.add_argument("--jitter", type=float, default=0.4, help="sigma de la latencia log-normal")
+    parser.add_argument("--llm-latency", type=float, default=300, help="mediana en ms de cada paso del LLM guionizado")
+    parser.add_argument("--bulletin-docs", type=int, default=300, help="documentos CAP en el boletín simulado")
+    parser.add_argument("--places", help="JSON con la tabla de lugares (mismo formato que PLACES)")
+    parser.add_argument("--no-gazetteer", action="store_true", help="sin nomenclátor local: todo pasa por geocoding")
+    parser.add_argument("--skip-agent", action="store_true", help="solo herramientas (sin langchain.agents)")
+    parser.add_argument("--compact", action="store_true", help="observaciones compactas para el LLM")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="bench_report.json")
+    args = parser.parse_args(argv)
+
+    # Cachés en un directorio temporal y sin prefetch: cada ejecución parte del mismo estado
+    os.environ["METEOROLOGIA_CACHE_DIR"] = tempfile.mkdtemp(prefix="meteorologia-bench-")
+    os.environ["METEOROLOGIA_PREFETCH_BUDGET"] = "0"
+
+    places = load_places(args.places)
+    upstreams = MockUpstreams(
+        places,
+        latency_ms=_parse_map(args.latency, DEFAULT_LATENCY_MS),
+        error_rate=_parse_map(args.errors, DEFAULT_ERROR_RATE),
+        jitter=args.jitter,
+        bulletin_docs=args.bulletin_docs,
+        seed=args.seed,
+    )
+    server = start_server(upstreams)
+    wire_upstreams(upstreams.base_url)
+
+    from metrics import registry
+    import gazetteer
+
+    aemet_key = "bench-key"
+    if args.no_gazetteer:
+        import aemet
+        aemet.ensure_gazetteer = lambda api_key: None
+    else:
+        gazetteer.build_from_aemet(aemet_key)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "latency_ms": upstreams.latency_ms,
+        "error_rate": upstreams.error_rate,
+    }
+    print("· herramientas...", file=sys.stderr)
+    report["tools"] = bench_tools(places, args.iterations, aemet_key)
+    # Regresiones funcionales (p. ej. "Madrid" tomado por un código de zona de 6 caracteres)
+    report["checks"] = check_alert_lookups(places)
+
+    if not args.skip_agent:
+        from engine import build_agent_executor
+        from tools import build_tools
+
+        scenarios = build_scenarios(places)
+        llm = make_scripted_llm(dict(scenarios), args.llm_latency, seed=args.seed)
+        executor = build_agent_executor(llm, build_tools(args.compact, aemet_key))
+        print("· turnos del agente...", file=sys.stderr)
+        report["agent"] = bench_agent(executor, scenarios, args.turns)
+        print("· concurrencia...", file=sys.stderr)
+        levels = [int(n) for n in args.sessions.split(",") if n.strip()]
+        report["concurrency"] = bench_concurrency(executor, scenarios, levels, args.turns_per_session, args.seed)
+
+    report["upstream_requests"] = dict(sorted(upstreams.requests.items()))
+    report["metrics"] = registry.snapshot()
+    server.shutdown()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+    for name, result in report["tools"].items():
+        print(f"{name:>20}  frío p50 {result['cold']['p50_ms']:>8} ms  p95 {result['cold']['p95_ms']:>8} ms  |  "
+              f"caliente p50 {result['warm']['p50_ms']:>7} ms  p95 {result['warm']['p95_ms']:>7} ms")
+    if "agent" in report:
+        agent = report["agent"]["latency"]
+        print(f"{'turno agente':>20}  p50 {agent['p50_ms']} ms  p95 {agent['p95_ms']} ms  p99 {agent['p99_ms']} ms")
+        for level in report["concurrency"]:
+            print(f"{level['sessions']:>12} sesiones  {level['throughput_turns_per_s']} turnos/s  "
+                  f"p95 {level['latency'].get('p95_ms')} ms  errores {level['errors']}")
+    for problem in report["checks"]:
+        print("REGRESIÓN: " + problem, file=sys.stderr)
+    print(f"Informe: {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main()["checks"] else 0)
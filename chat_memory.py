@@ -0,0 +1,145 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Memoria de conversación con presupuesto de tokens ---
+# Sustituye al ConversationBufferMemory ilimitado: las últimas K interacciones van literales
+# y las anteriores se van plegando en un resumen incremental, de modo que {chat_history}
+# no crece con la longitud de la sesión (y se reenvía en cada paso del ReAct).
+# El plegado en el turno es extractivo (sin LLM); el resumen con LLM se hace por lotes de K
+# turnos plegados y en segundo plano, nunca antes de devolver la respuesta.
+
+SUMMARY_PREFIX = "Resumen de la conversación anterior: "
+
+# Resúmenes con LLM en curso, compartidos por todas las sesiones del proceso
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token) que no requiere llamar al API de Gemini."""
+    return max(1, len(text) // 4)
+
+
+def _extract(line: str) -> str:
+    return line if len(line) <= 160 else line[:157] + "..."
+
+
+def fallback_summarize(summary: str, lines: list) -> str:
+    """Resumen sin LLM: conserva el principio de cada intervención plegada."""
+    return " ".join(filter(None, [summary] + [_extract(line) for line in lines]))
+
+
+class TokenBudgetMemory:
+    """Memoria por sesión compatible con el uso que hace agente.py de ConversationBufferMemory
+    (memory_key, load_memory_variables, save_context, clear)."""
+
+    def __init__(self, max_tokens: int = 2000, k: int = 4, memory_key: str = "chat_history",
+                 summarizer=None, count_tokens=estimate_tokens):
+        self.max_tokens = max_tokens
+        self.k = k
+        self.memory_key = memory_key
+        # summarizer(resumen_previo, lineas_nuevas) -> nuevo resumen, en segundo plano y por lotes.
+        # Sin él, solo fallback_summarize.
+        self.summarizer = summarizer
+        self.count_tokens = count_tokens
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        # Cada turno guarda su recuento de tokens para no recontar el historial entero
+        self.turns = []  # [(linea_humano, linea_ia, tokens)]
+        self.summary = ""
+        self.summary_tokens = 0
+        # Último resumen del LLM y líneas plegadas después (el resumen visible es extractivo sobre él)
+        self._base_summary = ""
+        self._unsummarized = []
+        self._summarizing = False
+        self._generation = getattr(self, "_generation", 0) + 1
+        self.metrics = {"turns": 0, "folded_turns": 0, "summaries": 0, "llm_summaries": 0, "raw_tokens": 0}
+
+    def _verbatim_tokens(self) -> int:
+        return sum(t[2] for t in self.turns)
+
+    def save_context(self, inputs: dict, outputs: dict) -> None:
+        human = f"Human: {inputs.get('input', '')}"
+        ai = f"AI: {outputs.get('output', '')}"
+        tokens = self.count_tokens(human) + self.count_tokens(ai)
+        with self._lock:
+            self.turns.append((human, ai, tokens))
+            self.metrics["turns"] += 1
+            self.metrics["raw_tokens"] += tokens
+            self._fold()
+
+    def _fold(self) -> None:
+        # Plegamos las interacciones más antiguas mientras haya más de K o se supere el
+        # presupuesto (la última siempre se conserva literal)
+        pending = []
+        verbatim = self._verbatim_tokens()
+        while len(self.turns) > 1 and (len(self.turns) > self.k or verbatim + self.summary_tokens > self.max_tokens):
+            human, ai, tokens = self.turns.pop(0)
+            pending.extend([human, ai])
+            verbatim -= tokens
+            self.metrics["folded_turns"] += 1
+        if not pending:
+            return
+
+        self._unsummarized.extend(pending)
+        self._set_summary(self._base_summary, self._unsummarized, verbatim)
+        self.metrics["summaries"] += 1
+        # Al LLM solo cuando se han acumulado K turnos plegados, y uno a la vez por sesión
+        if self.summarizer is not None and not self._summarizing and len(self._unsummarized) >= 2 * self.k:
+            self._summarizing = True
+            _summary_pool.submit(self._summarize, self.summarizer, self._base_summary,
+                                 list(self._unsummarized), self._generation)
+        elif not self._summarizing and len(self._unsummarized) > 8 * self.k:
+            # Sin resumen del LLM el lote no crece sin límite: el extractivo pasa a ser la base
+            self._base_summary, self._unsummarized = self.summary, []
+
+    def _set_summary(self, base: str, lines: list, verbatim: int) -> None:
+        # El resumen también respeta el presupuesto: lo que sobra tras los turnos literales.
+        # Se conserva el resumen del LLM y se descartan antes las líneas extractivas más
+        # antiguas, siempre enteras
+        allowance = max(0, self.max_tokens - verbatim) * 4
+        extracts = [_extract(line) for line in lines]
+        size = len(fallback_summarize(base, extracts))
+        while extracts and size > allowance:
+            size -= len(extracts.pop(0)) + (1 if base or extracts else 0)
+        summary = fallback_summarize(base, extracts)
+        if len(summary) > allowance:
+            # Solo queda el resumen del LLM y aun así no cabe: se corta por una frontera de palabra
+            summary = summary[:allowance].rsplit(" ", 1)[0] if allowance else ""
+        self.summary = summary
+        self.summary_tokens = self.count_tokens(summary) if summary else 0
+
+    def _summarize(self, summarizer, base: str, lines: list, generation: int) -> None:
+        try:
+            summary = summarizer(base, lines)
+        except Exception:
+            summary = None
+        with self._lock:
+            self._summarizing = False
+            # Si entretanto se ha borrado la memoria, el resumen ya no vale
+            if summary is None or generation != self._generation:
+                return
+            self._base_summary = summary
+            del self._unsummarized[:len(lines)]
+            self._set_summary(summary, self._unsummarized, self._verbatim_tokens())
+            self.metrics["llm_summaries"] += 1
+
+    def load_memory_variables(self, inputs: dict) -> dict:
+        with self._lock:
+            lines = [SUMMARY_PREFIX + self.summary] if self.summary else []
+            for human, ai, _ in self.turns:
+                lines.extend([human, ai])
+        return {self.memory_key: "\n".join(lines)}
+
+    def prompt_metrics(self) -> dict:
+        """Tamaño de {chat_history} frente a lo que ocuparía el buffer completo."""
+        with self._lock:
+            prompt_tokens = self._verbatim_tokens() + self.summary_tokens
+            raw = self.metrics["raw_tokens"]
+            return {
+                **self.metrics,
+                "prompt_tokens": prompt_tokens,
+                "saved_tokens": max(0, raw - prompt_tokens),
+                "verbatim_turns": len(self.turns),
+            }
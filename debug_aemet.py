@@ -1,6 +1,9 @@
-import requests
 import json
 
+import requests
+
+from http_client import http
+
 def test_aemet_connectivity_v2():
     print("Testing connectivity to opendata.aemet.es (V2)...")
     try:
@@ -11,7 +14,7 @@ def test_aemet_connectivity_v2():
         
         # Test 1: No key (expect 401)
         print(f"Requesting {url} without key...")
-        res = requests.get(url, verify=False, timeout=10)
+        res = http.get(url, verify=False, timeout=10)
         print(f"Status Code: {res.status_code}")
         
         if res.status_code == 404:
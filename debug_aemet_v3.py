@@ -1,5 +1,7 @@
 import requests
 
+from http_client import http
+
 def test_aemet_v3():
     print("Testing connectivity to opendata.aemet.es (V3)...")
     requests.packages.urllib3.disable_warnings()
@@ -14,7 +16,7 @@ def test_aemet_v3():
     for url in endpoints:
         print(f"--- Requesting {url} ---")
         try:
-            res = requests.get(url, verify=False, timeout=10)
+            res = http.get(url, verify=False, timeout=10)
             print(f"Status: {res.status_code}")
             if res.status_code == 401:
                 print("Got 401 (Auth required). Endpoint EXISTS.")
@@ -1,5 +1,7 @@
 import requests
 
+from http_client import http
+
 def test_aemet_v4():
     print("Testing connectivity to opendata.aemet.es (V4 - Headers)...")
     requests.packages.urllib3.disable_warnings()
@@ -14,7 +16,7 @@ def test_aemet_v4():
     
     print(f"Requesting {url} with headers...")
     try:
-        res = requests.get(url, headers=headers, verify=False, timeout=10)
+        res = http.get(url, headers=headers, verify=False, timeout=10)
         print(f"Status: {res.status_code}")
         if res.status_code == 404:
             print("Still 404.")
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache, partial
+from typing import NamedTuple
+
+from chat_memory import TokenBudgetMemory
+from gazetteer import ensure_gazetteer
+from instrumentation import InstrumentationHandler
+from metrics import registry
+from router import route
+from tools import build_tools, check_aemet_alerts, get_current_time, get_weather
+
+# --- Motor del agente, independiente de la interfaz ---
+# Prompt, montaje del AgentExecutor y el turno completo (fast-path del router o ciclo ReAct,
+# con memoria por sesión). La configuración llega explícita en cada petición (EngineConfig),
+# nunca de st.session_state: lo usan igual la app de Streamlit (agente.py), el servicio HTTP
+# y el modo batch (service.py) y benchmark.py.
+# Las dependencias pesadas (langchain.agents, langchain_google_genai) se importan al montar el
+# primer executor o LLM, no al importar el módulo: el arranque en frío no las paga.
+
+# Prompt mejorado con "Persona" y "Memoria"
+TEMPLATE = """Eres 'Meteorolog.IA', una asistente experta en meteorología y clima, profesional pero amable y con un toque futurista.
+
+Tu objetivo es dar información climática precisa y útil.
+1. SIEMPRE usa las herramientas si te preguntan por datos reales (clima, hora, alertas). No inventes.
+2. Si el usuario saluda, responde amablemente y ofrece tu ayuda.
+3. Si detectas una alerta o clima peligroso, da recomendaciones de seguridad.
+4. Usa formato Markdown atractivo (negritas, emojis) en tu respuesta final.
+5. Si necesitas varias herramientas independientes (p. ej. clima y alertas), pídelas juntas con run_parallel en un solo paso.
+6. Piensa paso a paso.
+
+Historial de conversación:
+{chat_history}
+
+Pregunta del usuario: {input}
+
+Herramientas disponibles:
+{tools}
+
+Usa el siguiente formato:
+
+Question: la pregunta del usuario
+Thought: piensa qué hacer (verificar historial, usar herramienta, o responder directo)
+Action: la herramienta a usar (una de [{tool_names}])
+Action Input: el input para la herramienta
+Observation: el resultado de la herramienta
+... (repite Thought/Action/Observation si es necesario)
+Thought: ya tengo la respuesta final
+Final Answer: la respuesta final al usuario
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+
+@lru_cache(maxsize=1)
+def get_prompt():
+    """PromptTemplate del agente, construido una vez por proceso."""
+    from langchain_core.prompts import PromptTemplate
+    return PromptTemplate.from_template(TEMPLATE)
+
+
+def make_summarizer(llm):
+    """Resumidor incremental para TokenBudgetMemory: pliega turnos antiguos en el resumen previo."""
+    def summarize(summary: str, lines: list) -> str:
+        request = (
+            "Actualiza el resumen de una conversación con un asistente meteorológico. "
+            "Conserva ciudades, fechas, preferencias del usuario y datos clave. Máximo 3 frases.\n\n"
+            f"Resumen actual: {summary or '(vacío)'}\n\nNuevas líneas:\n" + "\n".join(lines) +
+            "\n\nNuevo resumen:"
+        )
+        return llm.invoke(request).content.strip()
+    return summarize
+
+
+def build_agent_executor(llm, tools: list, verbose: bool = False):
+    """Agente ReAct + AgentExecutor sin memoria: el historial entra por {chat_history} en cada invoke."""
+    from langchain.agents import AgentExecutor, create_react_agent
+
+    # NOTA: create_react_agent estándar no inyecta memoria automáticamente en agent_scratchpad
+    agent = create_react_agent(llm, tools, get_prompt())
+    return AgentExecutor(
+        agent=agent,
+        tools=tools,
+        verbose=verbose,
+        handle_parsing_errors=True
+    )
+
+
+class EngineConfig(NamedTuple):
+    """Configuración de una petición (lo que en la app sale del sidebar)."""
+    google_api_key: str = ""
+    aemet_api_key: str = ""
+    model: str = "gemini-2.5-flash"
+    temperature: float = 0.0
+    compact_observations: bool = True
+    memory_budget: int = 2000
+    use_router: bool = True
+
+
+def config_from_env(**overrides) -> EngineConfig:
+    """Configuración base a partir del entorno (GOOGLE_API_KEY, AEMET_API_KEY, METEOROLOGIA_MODEL)."""
+    config = EngineConfig(
+        google_api_key=os.environ.get("GOOGLE_API_KEY", ""),
+        aemet_api_key=os.environ.get("AEMET_API_KEY", ""),
+        model=os.environ.get("METEOROLOGIA_MODEL", EngineConfig._field_defaults["model"]),
+    )
+    return config._replace(**{k: v for k, v in overrides.items() if k in EngineConfig._fields and v is not None})
+
+
+def _hash(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def gemini_llm(model: str, temperature: float, api_key: str):
+    """Cliente de Gemini (langchain_google_genai se importa al crear el primero)."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=temperature)
+
+
+class _Session:
+    __slots__ = ("memory", "lock", "last_used")
+
+    def __init__(self, memory: TokenBudgetMemory):
+        self.memory = memory
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+
+
+class Engine:
+    """LLMs y AgentExecutors compartidos por proceso (uno por modelo/temperatura/keys/modo de
+    observación) y memorias por sesión. Thread-safe: los turnos de sesiones distintas corren
+    en paralelo; los de una misma sesión, en orden."""
+
+    def __init__(self, llm_factory=gemini_llm, max_executors: int = 8, max_sessions: int = 10000,
+                 session_ttl: float = 6 * 3600, verbose: bool = False):
+        self.llm_factory = llm_factory
+        self.max_executors = max_executors
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.verbose = verbose
+        self._llms = OrderedDict()
+        self._executors = OrderedDict()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, cache: OrderedDict, key, build):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with self._lock:
+            value = cache.setdefault(key, value)
+            cache.move_to_end(key)
+            while len(cache) > self.max_executors:
+                cache.popitem(last=False)
+        return value
+
+    def llm(self, config: EngineConfig, temperature: float = None):
+        temperature = config.temperature if temperature is None else temperature
+        key = (config.model, temperature, _hash(config.google_api_key))
+        return self._cached(self._llms, key, lambda: self.llm_factory(config.model, temperature, config.google_api_key))
+
+    def executor(self, config: EngineConfig):
+        """Executor para la config; la key de AEMET va fijada en las herramientas, así que forma parte de la clave."""
+        key = (config.model, config.temperature, _hash(config.google_api_key), config.compact_observations,
+               _hash(config.aemet_api_key))
+        return self._cached(self._executors, key, lambda: build_agent_executor(
+            self.llm(config), build_tools(config.compact_observations, config.aemet_api_key), verbose=self.verbose))
+
+    def _session(self, session_id: str) -> _Session:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(TokenBudgetMemory())
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            # Las sesiones inactivas (o las más antiguas, por encima del máximo) se descartan
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if len(self._sessions) <= self.max_sessions and now - oldest.last_used < self.session_ttl:
+                    break
+                del self._sessions[oldest_id]
+        return session
+
+    def reset(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def answer(self, question: str, memory: TokenBudgetMemory, config: EngineConfig, callbacks=()) -> dict:
+        """Un turno completo con la memoria dada: fast-path del router si la intención es clara
+        y, si no, el ciclo ReAct. Devuelve {"answer", "path", "iterations", "latency"}."""
+        # Con key de AEMET, el nomenclátor local se genera en segundo plano si aún falta
+        ensure_gazetteer(config.aemet_api_key)
+        start = time.perf_counter()
+        answer, path, iterations = None, "router", 0
+        if config.use_router:
+            # Fast-path: intenciones simples se resuelven sin pasar por el ciclo ReAct (ver router.py)
+            handlers = {
+                "time": registry.timed("tool_seconds", tool="get_current_time")(get_current_time),
+                "weather": registry.timed("tool_seconds", tool="get_weather")(get_weather),
+            }
+            # Sin key de AEMET las alertas salen de una búsqueda web: mejor que las resuma el agente
+            if config.aemet_api_key:
+                handlers["alerts"] = registry.timed("tool_seconds", tool="check_aemet_alerts")(
+                    partial(check_aemet_alerts, api_key=config.aemet_api_key))
+            answer = route(question, handlers)
+        if answer is None:
+            path = "agent"
+            handler = InstrumentationHandler(config.model)
+            chat_history = memory.load_memory_variables({})[memory.memory_key]
+            response = self.executor(config).invoke(
+                {"input": question, "chat_history": chat_history},
+                {"callbacks": [*callbacks, handler]},
+            )
+            answer = response["output"]
+            iterations = handler.iterations
+        latency = time.perf_counter() - start
+        registry.observe("turn_seconds", latency, path=path)
+
+        memory.max_tokens = config.memory_budget
+        # El fast-path no hace ninguna llamada a Gemini, tampoco para resumir la memoria
+        memory.summarizer = make_summarizer(self.llm(config, temperature=0.0)) if path == "agent" else None
+        memory.save_context({"input": question}, {"output": answer})
+        return {"answer": answer, "path": path, "iterations": iterations, "latency": round(latency, 3)}
+
+    def ask(self, question: str, session_id: str = None, config: EngineConfig = None) -> dict:
+        """Turno de una sesión del servicio (memoria en el motor). Sin session_id, sesión nueva."""
+        session_id = session_id or uuid.uuid4().hex
+        session = self._session(session_id)
+        with session.lock:
+            result = self.answer(question, session.memory, config or config_from_env())
+        return {"session_id": session_id, **result}
+
+    def warm_up(self, background: bool = True) -> None:
+        """Importa las dependencias pesadas y construye el prompt antes del primer turno
+        (en un hilo de fondo por defecto, para no retrasar el arranque)."""
+        def load():
+            with registry.timer("warm_up_seconds"):
+                import langchain.agents
+                get_prompt()
+                try:
+                    import langchain_google_genai
+                except ImportError:
+                    pass
+                # El StreamlitCallbackHandler de cada turno (agente.py)
+                try:
+                    import langchain_community.callbacks.streamlit
+                except ImportError:
+                    pass
+
+        if background:
+            threading.Thread(target=load, name="engine-warm-up", daemon=True).start()
+        else:
+            load()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"llms": len(self._llms), "executors": len(self._executors), "sessions": len(self._sessions)}
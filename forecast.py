@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+
+from http_client import http
+from metrics import registry
+from resilience import protected_call
+from singleflight import group
+
+# --- Caché de Pronósticos Open-Meteo ---
+# Guardamos el payload ya parseado (current/daily/units), no el texto formateado,
+# para que cualquier formateador pueda reutilizarlo.
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+
+CURRENT_VARS = ("temperature_2m", "relative_humidity_2m", "apparent_temperature", "weather_code", "wind_speed_10m")
+DAILY_VARS = ("weather_code", "temperature_2m_max", "temperature_2m_min", "sunrise", "sunset")
+
+# Resolución de la rejilla del modelo (~0.1° ≈ 11 km). Dos peticiones dentro de la misma
+# celda devuelven el mismo pronóstico, así que comparten entrada de caché.
+GRID_STEP = 0.1
+
+# Open-Meteo refresca los datos "current" cada 15 minutos y el resto cada hora
+CURRENT_REFRESH = 15 * 60
+HOURLY_REFRESH = 60 * 60
+
+
+def grid_cell(lat: float, lon: float, step: float = GRID_STEP) -> tuple:
+    """Redondea unas coordenadas a la celda de la rejilla del modelo."""
+    return (round(round(lat / step) * step, 4), round(round(lon / step) * step, 4))
+
+
+def next_refresh(now: float, has_current: bool) -> float:
+    """Instante (epoch) de la siguiente actualización de Open-Meteo para ese tipo de datos."""
+    period = CURRENT_REFRESH if has_current else HOURLY_REFRESH
+    return (now // period + 1) * period
+
+
+class ForecastCache:
+    """LRU acotado por tamaño cuyas entradas caducan en la siguiente frontera de actualización."""
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            payload, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return payload
+
+    def put(self, key, payload: dict, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (payload, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def expires_at(self, key):
+        """Caducidad de una entrada (o None si no está), sin contar como acierto ni fallo."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def hit_ratio(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+forecast_cache = ForecastCache()
+registry.gauge("cache_hit_ratio", forecast_cache.hit_ratio, cache="forecast")
+
+
+def _params(cells, current, daily, hourly=(), days=None) -> dict:
+    params = {
+        "latitude": ",".join(str(cell[0]) for cell in cells),
+        "longitude": ",".join(str(cell[1]) for cell in cells),
+        "timezone": "auto",
+    }
+    if current:
+        params["current"] = ",".join(current)
+    if daily:
+        params["daily"] = ",".join(daily)
+    if hourly:
+        params["hourly"] = ",".join(hourly)
+    if days:
+        params["forecast_days"] = days
+    return params
+
+
+def _payload(weather_res: dict) -> dict:
+    return {
+        "current": weather_res.get("current", {}),
+        "current_units": weather_res.get("current_units", {}),
+        "daily": weather_res.get("daily", {}),
+        "daily_units": weather_res.get("daily_units", {}),
+        "hourly": weather_res.get("hourly", {}),
+        "hourly_units": weather_res.get("hourly_units", {}),
+        "utc_offset_seconds": weather_res.get("utc_offset_seconds", 0),
+    }
+
+
+def _get_json(url: str, params: dict):
+    # Un 429/5xx tras agotar los reintentos (o un cuerpo {"error": true}) es un fallo: lo ve
+    # el breaker de Open-Meteo y nunca llega a la caché
+    res = http.get(url, params=params, timeout=5)
+    res.raise_for_status()
+    data = res.json()
+    if isinstance(data, dict) and data.get("error"):
+        raise ValueError(f"Open-Meteo: {data.get('reason', 'error')}")
+    return data
+
+
+def forecast_key(lat: float, lon: float, current=CURRENT_VARS, daily=DAILY_VARS, hourly=(), days=None) -> tuple:
+    key = (grid_cell(lat, lon), tuple(current), tuple(daily))
+    if hourly or days:
+        key += (tuple(hourly), days)
+    return key
+
+
+def fetch_forecast(lat: float, lon: float, current=CURRENT_VARS, daily=DAILY_VARS, hourly=(), days=None,
+                   force: bool = False) -> dict:
+    """Devuelve el pronóstico parseado de Open-Meteo para la celda que contiene (lat, lon).
+    hourly/days piden además series horarias y más días (ver forecast_engine.py).
+    Con force=True ignora la caché (lo usa el prefetch). Lanza excepción si falla la conexión."""
+    key = forecast_key(lat, lon, current, daily, hourly, days)
+    payload = None if force else forecast_cache.get(key)
+    if payload is not None:
+        return payload
+
+    # Peticiones idénticas simultáneas (misma celda y variables) comparten una sola descarga
+    return group("forecast").do(key, _fetch_cell, key, current, daily, hourly, days)
+
+
+def _fetch_cell(key, current, daily, hourly=(), days=None) -> dict:
+    params = _params([key[0]], current, daily, hourly, days)
+    weather_res = protected_call("open-meteo", _get_json, FORECAST_URL, params, hedge=True)
+    payload = _payload(weather_res)
+    forecast_cache.put(key, payload, next_refresh(time.time(), bool(current)))
+    return payload
+
+
+def fetch_forecast_multi(coords, current=CURRENT_VARS, daily=DAILY_VARS) -> list:
+    """Versión por lotes de fetch_forecast: una sola petición a Open-Meteo con latitudes y
+    longitudes separadas por comas para todas las celdas que no estén ya en caché.
+    Devuelve los payloads en el mismo orden que coords."""
+    keys = [forecast_key(lat, lon, current, daily) for lat, lon in coords]
+    payloads = [forecast_cache.get(key) for key in keys]
+
+    missing = []
+    for key, payload in zip(keys, payloads):
+        if payload is None and key[0] not in missing:
+            missing.append(key[0])
+
+    if missing:
+        batch_key = (tuple(missing), tuple(current), tuple(daily))
+        fetched = group("forecast").do(batch_key, _fetch_cells, missing, current, daily)
+        payloads = [payload if payload is not None else fetched.get(key[0]) for key, payload in zip(keys, payloads)]
+
+    return payloads
+
+
+def _fetch_cells(cells, current, daily) -> dict:
+    weather_res = protected_call("open-meteo", _get_json, FORECAST_URL, _params(cells, current, daily), hedge=True)
+    # Con una sola coordenada Open-Meteo devuelve un objeto; con varias, una lista
+    if isinstance(weather_res, dict):
+        weather_res = [weather_res]
+    expires_at = next_refresh(time.time(), bool(current))
+    fetched = {}
+    for cell, item in zip(cells, weather_res):
+        fetched[cell] = _payload(item)
+        forecast_cache.put((cell, tuple(current), tuple(daily)), fetched[cell], expires_at)
+    return fetched
@@ -0,0 +1,243 @@
+import bisect
+import math
+import re
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from forecast import fetch_forecast
+from geocoding import normalize_location
+
+# --- Motor de pronóstico multi-día y horario ---
+# Una sola descarga por ubicación (7 días de series horarias y diarias, cacheada en
+# forecast.py) se guarda en columnas tipadas (array) alineadas con un índice temporal.
+# Las preguntas de seguimiento ("mañana por la tarde", "el fin de semana", "¿cuándo
+# llueve?") son cortes sobre esas columnas con búsqueda binaria, sin volver a la red.
+
+HOURLY_VARS = ("temperature_2m", "precipitation_probability", "precipitation", "weather_code", "wind_speed_10m")
+DAILY_VARS = ("weather_code", "temperature_2m_max", "temperature_2m_min", "precipitation_sum",
+              "precipitation_probability_max")
+FORECAST_DAYS = 7
+# Variables de la descarga de series: también las usa el prefetch para calentar esta entrada
+SERIES_REQUEST = {"current": (), "daily": DAILY_VARS, "hourly": HOURLY_VARS, "days": FORECAST_DAYS}
+
+RAIN_PROBABILITY = 50
+RAIN_MM = 0.1
+
+WEEKDAYS = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+WEEKDAY_SHORT = ("lun", "mar", "mié", "jue", "vie", "sáb", "dom")
+
+# Franjas del día: clave normalizada -> (hora inicio, hora fin, etiqueta)
+DAY_PARTS = {
+    "madrugada": (0, 6, "de madrugada"),
+    "manana": (6, 12, "por la mañana"),
+    "mediodia": (12, 15, "a mediodía"),
+    "tarde": (12, 20, "por la tarde"),
+    "noche": (20, 24, "por la noche"),
+}
+
+WMO_CODES = {
+    0: "despejado", 1: "poco nuboso", 2: "parcialmente nuboso", 3: "cubierto", 45: "niebla", 48: "niebla con escarcha",
+    51: "llovizna débil", 53: "llovizna", 55: "llovizna intensa", 56: "llovizna helada", 57: "llovizna helada intensa",
+    61: "lluvia débil", 63: "lluvia", 65: "lluvia fuerte", 66: "lluvia helada", 67: "lluvia helada fuerte",
+    71: "nieve débil", 73: "nieve", 75: "nieve fuerte", 77: "granizo fino", 80: "chubascos débiles",
+    81: "chubascos", 82: "chubascos fuertes", 85: "chubascos de nieve", 86: "chubascos de nieve fuertes",
+    95: "tormenta", 96: "tormenta con granizo", 99: "tormenta con granizo fuerte",
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _minutes(dt: datetime) -> int:
+    return int((dt - _EPOCH).total_seconds() // 60)
+
+
+def _from_minutes(minutes: int) -> datetime:
+    return _EPOCH + timedelta(minutes=minutes)
+
+
+def _column(values, typecode: str = "f") -> array:
+    return array(typecode, (math.nan if v is None else v for v in values))
+
+
+class ForecastSeries:
+    """Series horarias y diarias en columnas tipadas. Las horas son locales de la ubicación."""
+
+    def __init__(self, payload: dict):
+        hourly = payload.get("hourly", {})
+        daily = payload.get("daily", {})
+        self.utc_offset = payload.get("utc_offset_seconds", 0)
+        self.time = array("l", (_minutes(datetime.fromisoformat(t)) for t in hourly.get("time", [])))
+        self.hourly = {name: _column(hourly.get(name, [])) for name in HOURLY_VARS}
+        self.days = [datetime.fromisoformat(d).date() for d in daily.get("time", [])]
+        self.daily = {name: _column(daily.get(name, [])) for name in DAILY_VARS}
+
+    def now(self) -> datetime:
+        """Hora local actual en la ubicación del pronóstico."""
+        return datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=self.utc_offset)
+
+    def _slice(self, start: datetime, end: datetime) -> slice:
+        return slice(bisect.bisect_left(self.time, _minutes(start)), bisect.bisect_left(self.time, _minutes(end)))
+
+    def range_stats(self, start: datetime, end: datetime):
+        """Agregados de las horas en [start, end): temperatura mín/máx/media, probabilidad
+        máxima y total de precipitación, viento máximo y el código de tiempo más severo."""
+        window = self._slice(start, end)
+        temps = [t for t in self.hourly["temperature_2m"][window] if not math.isnan(t)]
+        if not temps:
+            return None
+        probs = [p for p in self.hourly["precipitation_probability"][window] if not math.isnan(p)]
+        precip = [p for p in self.hourly["precipitation"][window] if not math.isnan(p)]
+        wind = [w for w in self.hourly["wind_speed_10m"][window] if not math.isnan(w)]
+        codes = [int(c) for c in self.hourly["weather_code"][window] if not math.isnan(c)]
+        return {
+            "tmin": min(temps),
+            "tmax": max(temps),
+            "tavg": sum(temps) / len(temps),
+            "pp": max(probs) if probs else None,
+            "prec": sum(precip) if precip else None,
+            "vmax": max(wind) if wind else None,
+            "code": max(codes) if codes else None,
+        }
+
+    def next_rain(self, start: datetime):
+        """Primera hora desde `start` con probabilidad o cantidad de lluvia significativa."""
+        window = slice(bisect.bisect_left(self.time, _minutes(start)), len(self.time))
+        probs = self.hourly["precipitation_probability"]
+        precip = self.hourly["precipitation"]
+        for i in range(window.start, window.stop):
+            if probs[i] >= RAIN_PROBABILITY or precip[i] >= RAIN_MM:
+                return _from_minutes(self.time[i])
+        return None
+
+    def daily_rows(self, start: datetime, end: datetime) -> list:
+        """Resumen diario (mín/máx, lluvia, cielo) para los días que toca [start, end)."""
+        first = bisect.bisect_left(self.days, start.date())
+        last = bisect.bisect_left(self.days, (end - timedelta(minutes=1)).date() + timedelta(days=1))
+        rows = []
+        for i in range(first, last):
+            code = self.daily["weather_code"][i]
+            rows.append({
+                "date": self.days[i],
+                "tmin": self.daily["temperature_2m_min"][i],
+                "tmax": self.daily["temperature_2m_max"][i],
+                "pp": self.daily["precipitation_probability_max"][i],
+                "prec": self.daily["precipitation_sum"][i],
+                "code": None if math.isnan(code) else int(code),
+            })
+        return rows
+
+
+_series = {}
+_series_lock = threading.Lock()
+
+
+def get_series(lat: float, lon: float) -> ForecastSeries:
+    """Series de la celda de (lat, lon). La descarga sale de la caché de forecast.py; las
+    columnas se construyen una vez por payload y se reutilizan en las preguntas siguientes."""
+    payload = fetch_forecast(lat, lon, **SERIES_REQUEST)
+    key = (round(lat, 2), round(lon, 2))
+    with _series_lock:
+        entry = _series.get(key)
+        if entry is not None and entry[0] is payload:
+            return entry[1]
+    series = ForecastSeries(payload)
+    with _series_lock:
+        if len(_series) > 256:
+            _series.clear()
+        _series[key] = (payload, series)
+    return series
+
+
+def resolve_period(text: str, now: datetime):
+    """Traduce una expresión temporal en español a (etiqueta, inicio, fin) en hora local."""
+    text = normalize_location(text or "")
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Las series son horarias: la hora en curso entra en el periodo (a las 23:30, "hoy" es 23-24)
+    now = now.replace(minute=0, second=0, microsecond=0)
+
+    match = re.search(r"proxim[oa]s (\d+) dias", text)
+    if match:
+        days = max(1, min(FORECAST_DAYS, int(match.group(1))))
+        return f"próximos {days} días", now, today + timedelta(days=days + 1)
+    if "semana" in text and "fin de semana" not in text:
+        return "próximos 7 días", now, today + timedelta(days=FORECAST_DAYS)
+    if "fin de semana" in text or "finde" in text:
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7 if today.weekday() != 6 else -1)
+        return "fin de semana", max(now, saturday), saturday + timedelta(days=2)
+    if "ahora" in text:
+        return "próximas horas", now, now + timedelta(hours=3)
+
+    # Día: "pasado mañana", "mañana", un día de la semana o (por defecto) hoy
+    if "pasado manana" in text:
+        day, label = today + timedelta(days=2), "pasado mañana"
+        text = text.replace("pasado manana", "")
+    elif re.search(r"(?<!esta )(?<!la )\bmanana\b", text):
+        # "mañana" como día, no como franja ("esta mañana", "por la mañana")
+        day, label = today + timedelta(days=1), "mañana"
+        text = re.sub(r"(?<!esta )(?<!la )\bmanana\b", "", text, count=1)
+    else:
+        day, label = today, "hoy"
+        for i, name in enumerate(WEEKDAYS):
+            if name in text:
+                day = today + timedelta(days=(i - today.weekday()) % 7)
+                label = name if day != today else "hoy"
+                break
+
+    for part, (start_hour, end_hour, part_label) in DAY_PARTS.items():
+        if re.search(rf"\b{part}\b", text):
+            start = day + timedelta(hours=start_hour)
+            end = day + timedelta(hours=end_hour)
+            if day == today:
+                # Franja ya pasada ("esta tarde" a las 21:00): al menos su última hora, nunca inicio > fin
+                start = min(max(start, now), end - timedelta(hours=1))
+            return f"{label} {part_label}", start, end
+    return label, max(day, now) if day == today else day, day + timedelta(days=1)
+
+
+def _fmt(value, decimals: int = 0):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "?"
+    return f"{value:.{decimals}f}"
+
+
+def forecast_report(place: dict, period: str = "", compact: bool = False) -> str:
+    """Pronóstico de `place` para una expresión temporal ("mañana por la tarde", "fin de semana"...)."""
+    series = get_series(place["latitude"], place["longitude"])
+    label, start, end = resolve_period(period, series.now())
+    stats = series.range_stats(start, end)
+    if stats is None:
+        return f"No tengo datos de pronóstico para {place['name']} en ese periodo (máximo {FORECAST_DAYS} días)."
+    rain = series.next_rain(series.now().replace(minute=0, second=0, microsecond=0))
+    days = series.daily_rows(start, end) if end - start > timedelta(days=1) else []
+    sky = WMO_CODES.get(stats["code"], "?")
+    span = f"{start:%d/%m %H:%M}–{end:%d/%m %H:%M}"
+
+    if compact:
+        fields = [
+            f"fc lugar={place['name']}", f"periodo={label.replace(' ', '_')}", f"desde={start:%d/%mT%H}", f"hasta={end:%d/%mT%H}",
+            f"tmin={_fmt(stats['tmin'])}", f"tmax={_fmt(stats['tmax'])}", f"tmed={_fmt(stats['tavg'])}",
+            f"pp={_fmt(stats['pp'])}", f"prec={_fmt(stats['prec'], 1)}", f"vmax={_fmt(stats['vmax'])}",
+            f"cielo={sky.replace(' ', '_')}", f"lluvia={rain:%d/%mT%H}" if rain else "lluvia=no",
+        ]
+        lines = [" ".join(fields)]
+        lines += [
+            f"{WEEKDAY_SHORT[d['date'].weekday()]}{d['date']:%d} {_fmt(d['tmin'])}/{_fmt(d['tmax'])} pp={_fmt(d['pp'])} {WMO_CODES.get(d['code'], '?')}"
+            for d in days
+        ]
+        return " | ".join(lines)
+
+    lines = [
+        f"📆 **Pronóstico para {place['name']} — {label}** ({span})",
+        f"🌡️ **Temperatura:** {_fmt(stats['tmin'])}° – {_fmt(stats['tmax'])}° (media {_fmt(stats['tavg'])}°)",
+        f"🌧️ **Lluvia:** prob. máx {_fmt(stats['pp'])}%, total {_fmt(stats['prec'], 1)} mm",
+        f"💨 **Viento máx:** {_fmt(stats['vmax'])} km/h",
+        f"☁️ **Cielo:** {sky}",
+        f"⏱️ **Próxima lluvia:** {rain:%d/%m %H:%M}" if rain else "⏱️ **Próxima lluvia:** no se espera en los próximos días",
+    ]
+    for d in days:
+        lines.append(
+            f"- {WEEKDAY_SHORT[d['date'].weekday()]} {d['date']:%d/%m}: {_fmt(d['tmin'])}° / {_fmt(d['tmax'])}°, "
+            f"lluvia {_fmt(d['pp'])}%, {WMO_CODES.get(d['code'], '?')}"
+        )
+    return "\n".join(lines)
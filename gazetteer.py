@@ -0,0 +1,285 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+import requests
+
+from geocoding import CACHE_DIR, geocode, normalize_location
+from http_client import http
+from metrics import registry
+
+# --- Nomenclátor local de municipios españoles ---
+# Se construye una vez a partir de AEMET maestro/municipios y se guarda en un fichero
+# binario compacto que se abre con mmap: búsquedas exactas y por prefijo con búsqueda
+# binaria sobre las claves ordenadas, y búsqueda difusa (sin acentos, tolerante a erratas)
+# con un índice de trigramas. Cada municipio lleva lat/lon, provincia y zona de avisos AEMET,
+# así que las consultas en España no necesitan geocoding remoto.
+
+MUNICIPIOS_URL = "https://opendata.aemet.es/opendata/api/maestro/municipios"
+
+GAZETTEER_PATH = os.path.join(CACHE_DIR, "municipios.gaz")
+
+MAGIC = b"GAZ1"
+HEADER = struct.Struct("<4sI")
+# lat, lon, código INE, habitantes, offset/long. de la clave, offset/long. del nombre, zona AEMET
+RECORD = struct.Struct("<ffIIIHIH6s")
+
+FUZZY_THRESHOLD = 0.75
+
+# Tras un fallo al generarlo, no se reintenta hasta pasado este tiempo
+BUILD_RETRY = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+class Municipality(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+    province_code: str
+    zone: str
+    population: int
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def write_gazetteer(rows, path: str = GAZETTEER_PATH) -> int:
+    """Escribe el fichero binario. rows: iterable de (nombre, lat, lon, ine, habitantes, zona).
+    Ordena por clave normalizada (y población descendente para desempatar homónimos)."""
+    entries = sorted(
+        ((normalize_location(name), name, lat, lon, ine, pop, zone) for name, lat, lon, ine, pop, zone in rows),
+        key=lambda e: (e[0], -e[5]),
+    )
+    blob = bytearray()
+    records = bytearray()
+    for key, name, lat, lon, ine, pop, zone in entries:
+        key_bytes, name_bytes = key.encode(), name.encode()
+        key_off = len(blob)
+        blob += key_bytes
+        name_off = len(blob)
+        blob += name_bytes
+        records += RECORD.pack(lat, lon, ine, pop, key_off, len(key_bytes), name_off, len(name_bytes), zone.encode()[:6])
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        f.write(records)
+        f.write(blob)
+    os.replace(tmp, path)
+    return len(entries)
+
+
+def build_from_aemet(api_key: str, path: str = GAZETTEER_PATH) -> int:
+    """Descarga maestro/municipios de AEMET y genera el nomenclátor."""
+    requests.packages.urllib3.disable_warnings()
+    res = http.get(MUNICIPIOS_URL, params={"api_key": api_key}, verify=False, timeout=30)
+    res.raise_for_status()
+    data = res.json()
+    # Algunos endpoints de AEMET devuelven primero una URL de 'datos'
+    if isinstance(data, dict) and data.get("datos"):
+        data = http.get(data["datos"], verify=False, timeout=30)
+        try:
+            data = data.content.decode("utf-8")
+        except UnicodeDecodeError:
+            data = data.content.decode("iso-8859-15")
+        data = json.loads(data)
+
+    rows = []
+    for m in data:
+        try:
+            ine = int(str(m["id"]).replace("id", ""))
+            rows.append((
+                m["nombre"],
+                float(m["latitud_dec"]),
+                float(m["longitud_dec"]),
+                ine,
+                int(float(m.get("num_hab") or 0)),
+                str(m.get("zona_comarcal") or ""),
+            ))
+        except (KeyError, ValueError):
+            continue
+    return write_gazetteer(rows, path)
+
+
+class Gazetteer:
+    """Lector del fichero binario vía mmap; los registros se decodifican bajo demanda."""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un nomenclátor válido")
+        self._blob_start = HEADER.size + self.count * RECORD.size
+        self._trigram_index = None
+        self._lock = threading.Lock()
+
+    def _record(self, i: int):
+        return RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+
+    def _key(self, i: int) -> str:
+        rec = self._record(i)
+        start = self._blob_start + rec[4]
+        return self._mm[start:start + rec[5]].decode()
+
+    def _municipality(self, i: int) -> Municipality:
+        lat, lon, ine, pop, _, _, name_off, name_len, zone = self._record(i)
+        start = self._blob_start + name_off
+        name = self._mm[start:start + name_len].decode()
+        return Municipality(name, round(lat, 5), round(lon, 5), f"{ine:05d}"[:2], zone.decode().rstrip("\0"), pop)
+
+    def _lower_bound(self, key: str) -> int:
+        # bisect sobre una vista perezosa de las claves ordenadas (como recorrer un trie)
+        return bisect.bisect_left(_KeyView(self), key)
+
+    def exact(self, name: str) -> list:
+        key = normalize_location(name)
+        i = self._lower_bound(key)
+        found = []
+        while i < self.count and self._key(i) == key:
+            found.append(self._municipality(i))
+            i += 1
+        return found
+
+    def prefix(self, text: str, limit: int = 10) -> list:
+        key = normalize_location(text)
+        i = self._lower_bound(key)
+        found = []
+        while i < self.count and len(found) < limit and self._key(i).startswith(key):
+            found.append(self._municipality(i))
+            i += 1
+        return found
+
+    def _trigrams_index(self) -> dict:
+        # Se construye la primera vez que hace falta una búsqueda difusa
+        with self._lock:
+            if self._trigram_index is None:
+                index = defaultdict(list)
+                for i in range(self.count):
+                    for gram in _trigrams(self._key(i)):
+                        index[gram].append(i)
+                self._trigram_index = dict(index)
+            return self._trigram_index
+
+    def fuzzy(self, text: str, limit: int = 5, threshold: float = FUZZY_THRESHOLD) -> list:
+        """Candidatos por similitud de trigramas (coeficiente de Dice), de mayor a menor."""
+        key = normalize_location(text)
+        grams = _trigrams(key)
+        index = self._trigrams_index()
+        shared = defaultdict(int)
+        for gram in grams:
+            for i in index.get(gram, ()):
+                shared[i] += 1
+        scored = []
+        for i, n in shared.items():
+            score = 2 * n / (len(grams) + len(_trigrams(self._key(i))))
+            if score >= threshold:
+                scored.append((score, -self._record(i)[3], i))
+        scored.sort(reverse=True)
+        return [(self._municipality(i), round(score, 3)) for score, _, i in scored[:limit]]
+
+    def resolve(self, name: str, fuzzy: bool = True):
+        """Mejor municipio para un nombre: coincidencia exacta (el más poblado) o difusa."""
+        found = self.exact(name)
+        if found:
+            return found[0]
+        if not fuzzy:
+            return None
+        candidates = self.fuzzy(name, limit=1)
+        return candidates[0][0] if candidates else None
+
+
+class _KeyView:
+    """Secuencia de solo lectura con las claves del nomenclátor, para bisect."""
+
+    def __init__(self, gazetteer: Gazetteer):
+        self._g = gazetteer
+
+    def __len__(self):
+        return self._g.count
+
+    def __getitem__(self, i):
+        return self._g._key(i)
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Nomenclátor del proceso, o None si todavía no se ha generado el fichero."""
+    global _gazetteer
+    if _gazetteer is None and os.path.exists(GAZETTEER_PATH):
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer(GAZETTEER_PATH)
+    return _gazetteer
+
+
+_build_thread = None
+_last_failure = 0.0
+
+
+def _build(api_key: str) -> None:
+    global _last_failure
+    try:
+        with registry.timer("gazetteer_build_seconds"):
+            total = build_from_aemet(api_key)
+        logger.info("Nomenclátor generado en %s: %d municipios.", GAZETTEER_PATH, total)
+    except Exception:
+        _last_failure = time.monotonic()
+        registry.inc("gazetteer_build_failures_total")
+        logger.exception("No se pudo generar el nomenclátor desde AEMET; se reintentará en %d s.", BUILD_RETRY)
+
+
+def ensure_gazetteer(api_key: str, background: bool = True) -> None:
+    """Genera el nomenclátor si falta, como paso propio: al arrancar el servicio y en el primer
+    turno con API key de AEMET (en segundo plano por defecto). Los fallos se registran y se
+    reintenta pasado BUILD_RETRY; mientras tanto se sigue usando el geocoder remoto."""
+    global _build_thread
+    if not api_key or get_gazetteer() is not None:
+        return
+    with _gazetteer_lock:
+        if _build_thread is not None and _build_thread.is_alive():
+            return
+        if _last_failure and time.monotonic() - _last_failure < BUILD_RETRY:
+            return
+        _build_thread = threading.Thread(target=_build, args=(api_key,), name="gazetteer-build", daemon=True)
+        _build_thread.start()
+    if not background:
+        _build_thread.join()
+
+
+def resolve_place(location: str):
+    """Como geocoding.geocode, pero resolviendo primero contra el nomenclátor local.
+    Solo coincidencias exactas: un nombre extranjero no debe acabar en un pueblo parecido."""
+    gazetteer = get_gazetteer()
+    municipality = gazetteer.resolve(location, fuzzy=False) if gazetteer is not None else None
+    if municipality is not None:
+        return {
+            "name": municipality.name,
+            "country": "España",
+            "latitude": municipality.latitude,
+            "longitude": municipality.longitude,
+            "zone": municipality.zone,
+        }
+    return geocode(location)
+
+
+if __name__ == "__main__":
+    # Uso: python gazetteer.py [AEMET_API_KEY]  (por defecto, la variable AEMET_API_KEY)
+    total = build_from_aemet(sys.argv[1] if len(sys.argv) > 1 else os.environ["AEMET_API_KEY"])
+    print(f"Nomenclátor generado en {GAZETTEER_PATH}: {total} municipios.")
@@ -0,0 +1,144 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from http_client import http
+from metrics import registry
+from resilience import protected_call
+from singleflight import group
+
+# --- Caché de Geocoding (LRU en memoria + SQLite en disco) ---
+# Vive en un módulo importado (no en agente.py) para sobrevivir a los reruns de Streamlit:
+# Python solo ejecuta este fichero una vez por proceso.
+
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+
+CACHE_DIR = os.environ.get("METEOROLOGIA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Las coordenadas de una ciudad no cambian: TTL largo
+GEOCODING_TTL = 30 * 24 * 3600
+
+
+def normalize_location(location: str) -> str:
+    """Normaliza un nombre de lugar para usarlo como clave: sin acentos, minúsculas y espacios colapsados."""
+    text = unicodedata.normalize("NFKD", location)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+class GeocodingCache:
+    """LRU en memoria delante de una tabla SQLite. Thread-safe y con contadores de aciertos/fallos."""
+
+    def __init__(self, path: str, maxsize: int = 1024, ttl: float = GEOCODING_TTL):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS geocoding ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._lru.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[0]
+
+            row = self._db.execute(
+                "SELECT payload, stored_at FROM geocoding WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] < self.ttl:
+                place = json.loads(row[0])
+                self._remember(key, place, row[1])
+                self.stats["disk_hits"] += 1
+                return place
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, place: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, place, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocoding (key, payload, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(place, ensure_ascii=False), now),
+            )
+            self._db.commit()
+
+    def _remember(self, key, place, stored_at):
+        self._lru[key] = (place, stored_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def clear(self) -> None:
+        """Vacía la LRU y la tabla SQLite (lo usa benchmark.py para medir en frío)."""
+        with self._lock:
+            self._lru.clear()
+            self._db.execute("DELETE FROM geocoding")
+            self._db.commit()
+
+
+geocoding_cache = GeocodingCache(os.path.join(CACHE_DIR, "geocoding.sqlite"))
+registry.gauge("cache_hit_ratio", geocoding_cache.hit_ratio, cache="geocoding")
+
+
+def geocode(location: str):
+    """Resuelve un nombre de lugar a {name, country, latitude, longitude}.
+    Devuelve None si el geocoder no lo conoce; lanza excepción si falla la conexión."""
+    key = normalize_location(location)
+    place = geocoding_cache.get(key)
+    if place is not None:
+        return place
+
+    # Sesiones concurrentes preguntando por la misma ciudad comparten una única petición
+    return group("geocoding").do(key, _fetch_place, key, location)
+
+
+def _get_json(url: str, params: dict) -> dict:
+    # Un 429/5xx tras agotar los reintentos (o un cuerpo {"error": true}) es un fallo: lo ve
+    # el breaker de Open-Meteo y nunca llega a la caché
+    res = http.get(url, params=params, timeout=5)
+    res.raise_for_status()
+    data = res.json()
+    if isinstance(data, dict) and data.get("error"):
+        raise ValueError(f"Open-Meteo: {data.get('reason', 'error')}")
+    return data
+
+
+def _fetch_place(key: str, location: str):
+    params = {"name": location.strip(), "count": 1, "language": "es", "format": "json"}
+    geo_res = protected_call("open-meteo", _get_json, GEOCODING_URL, params, hedge=True)
+    if not geo_res.get("results"):
+        return None
+
+    result = geo_res["results"][0]
+    place = {
+        "name": result["name"],
+        "country": result.get("country", ""),
+        "latitude": result["latitude"],
+        "longitude": result["longitude"],
+    }
+    geocoding_cache.put(key, place)
+    return place
@@ -0,0 +1,115 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import registry
+
+# --- Cliente HTTP compartido por todas las herramientas ---
+# Un único pool de conexiones keep-alive por host para todo el proceso: las sesiones
+# concurrentes de Streamlit reutilizan conexiones TCP+TLS ya abiertas en lugar de
+# pagar un handshake en frío por cada requests.get.
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+DEFAULT_MAX_PER_HOST = int(os.environ.get("METEOROLOGIA_HTTP_MAX_PER_HOST", "10"))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("METEOROLOGIA_HTTP_CONNECT_TIMEOUT", "3.05"))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("METEOROLOGIA_HTTP_READ_TIMEOUT", "10"))
+
+
+class HttpClient:
+    """Cliente GET thread-safe con pool por host, límite de conexiones concurrentes,
+    reintentos con backoff exponencial + jitter en 429/5xx y timeouts separados de conexión y lectura."""
+
+    def __init__(
+        self,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        host_limits: dict = None,
+        retries: int = 3,
+        backoff: float = 0.3,
+        max_backoff: float = 5.0,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        # Los adapters (y sus pools urllib3) son thread-safe y se comparten entre hilos.
+        # pool_block=True hace que el tamaño del pool sea un tope real de conexiones por host.
+        self._default_adapter = HTTPAdapter(pool_maxsize=max_per_host, pool_block=True)
+        self._host_adapters = {
+            host: HTTPAdapter(pool_maxsize=limit, pool_block=True)
+            for host, limit in (host_limits or {}).items()
+        }
+        # requests.Session no es thread-safe (cookies, estado), así que cada hilo tiene
+        # la suya, montada sobre los adapters compartidos.
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._default_adapter)
+            session.mount("https://", self._default_adapter)
+            for host, adapter in self._host_adapters.items():
+                session.mount(f"https://{host}", adapter)
+                session.mount(f"http://{host}", adapter)
+            self._local.session = session
+        return session
+
+    def _timeout(self, timeout):
+        # Un número suelto es el timeout de lectura; el de conexión se mantiene corto.
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (min(self.connect_timeout, timeout), timeout)
+
+    def _sleep_before_retry(self, attempt: int, response=None) -> None:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(float(retry_after), self.max_backoff)
+        else:
+            # "Full jitter": evita que varias sesiones reintenten a la vez contra el mismo host
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        time.sleep(delay)
+
+    def get(self, url: str, params=None, timeout=None, **kwargs) -> requests.Response:
+        """GET con reintentos. Devuelve la última respuesta (aunque sea 429/5xx) si se agotan
+        los reintentos; relanza el error de red si no se pudo conectar en ningún intento."""
+        timeout = self._timeout(timeout)
+        session = self._session()
+        host = urlsplit(url).hostname or "?"
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            if attempt:
+                registry.inc("http_retries_total", host=host)
+            start = time.perf_counter()
+            try:
+                response = session.get(url, params=params, timeout=timeout, **kwargs)
+            except requests.ConnectionError:
+                registry.observe("http_request_seconds", time.perf_counter() - start, host=host, status="connection_error")
+                # Incluye ConnectTimeout. Un ReadTimeout no se reintenta: multiplicaría la espera.
+                if last:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            except requests.Timeout:
+                registry.observe("http_request_seconds", time.perf_counter() - start, host=host, status="timeout")
+                raise
+            # Latencia por intento (hasta tener la respuesta; con stream=True, hasta las cabeceras)
+            registry.observe("http_request_seconds", time.perf_counter() - start, host=host, status=f"{response.status_code // 100}xx")
+            if response.status_code not in RETRY_STATUSES or last:
+                return response
+            response.close()
+            self._sleep_before_retry(attempt, response)
+
+
+http = HttpClient(host_limits={"opendata.aemet.es": 4})
@@ -0,0 +1,117 @@
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+# --- Perfil de arranque en frío ---
+# Importa los módulos de primer nivel de agente.py (o los que se indiquen) en un intérprete
+# nuevo con `python -X importtime` y resume dónde se va el tiempo: los módulos más caros por
+# tiempo acumulado y qué dependencias pesadas se cargan ya al arrancar. Con --baseline
+# compara con un informe anterior y falla si el arranque empeora más del umbral.
+#
+#   python importtime.py --output importtime_report.json
+#   python importtime.py --baseline importtime_report.json --threshold 0.2
+
+# Dependencias que no deberían cargarse al arrancar la app (ver engine.py y tools.py)
+HEAVY_MODULES = ("langchain.agents", "langchain_community", "langchain_google_genai", "duckduckgo_search")
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def entry_imports(path: str = "agente.py") -> list:
+    """Módulos que importa `path` a nivel de módulo (sin ejecutarlo)."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def profile(modules: list, python: str = sys.executable) -> list:
+    """Importa `modules` con -X importtime; devuelve [(módulo, self_us, cumulative_us, nivel)]."""
+    code = "\n".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import fallido")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def summarize(rows: list, top: int = 15) -> dict:
+    """Total, módulos más caros y dependencias pesadas cargadas."""
+    # El tiempo total es la suma de los imports de primer nivel (nivel 0)
+    total_us = sum(cumulative for _, _, cumulative, level in rows if level == 0)
+    loaded = {name for name, _, _, _ in rows}
+    slowest = sorted(rows, key=lambda r: r[2], reverse=True)[:top]
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(rows),
+        "heavy_loaded": sorted(m for m in HEAVY_MODULES if m in loaded or any(n.startswith(m + ".") for n in loaded)),
+        "top": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(self_us / 1000, 1)}
+            for name, self_us, cumulative, _ in slowest
+        ],
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Regresiones respecto a `baseline`: tiempo total por encima del umbral y nuevas dependencias pesadas."""
+    problems = []
+    if baseline.get("total_ms") and report["total_ms"] > baseline["total_ms"] * (1 + threshold):
+        problems.append(f"arranque {report['total_ms']} ms frente a {baseline['total_ms']} ms (+{threshold:.0%} permitido)")
+    new_heavy = set(report["heavy_loaded"]) - set(baseline.get("heavy_loaded", []))
+    if new_heavy:
+        problems.append("nuevas dependencias pesadas al arrancar: " + ", ".join(sorted(new_heavy)))
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Perfil de imports en frío de Meteorolog.IA (python -X importtime).")
+    parser.add_argument("modules", nargs="*", help="módulos a importar (por defecto, los de primer nivel de agente.py)")
+    parser.add_argument("--entry", default="agente.py", help="script del que sacar los imports por defecto")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3, help="se queda con la ejecución más rápida")
+    parser.add_argument("--baseline", help="informe JSON anterior con el que comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="empeoramiento máximo del total (0.2 = 20%%)")
+    parser.add_argument("--output", default="importtime_report.json")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or entry_imports(args.entry)
+    # La primera ejecución compila los .pyc y calienta la caché de disco: nos quedamos con la mejor
+    report = min((summarize(profile(modules), args.top) for _ in range(max(1, args.runs))), key=lambda r: r["total_ms"])
+    report["imports"] = modules
+
+    print(f"Arranque: {report['total_ms']} ms en {report['modules']} módulos")
+    for row in report["top"]:
+        print(f"  {row['cumulative_ms']:>9.1f} ms  {row['self_ms']:>8.1f} ms  {row['module']}")
+    print("Dependencias pesadas cargadas: " + (", ".join(report["heavy_loaded"]) or "ninguna"))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.threshold)
+        for problem in problems:
+            print("REGRESIÓN: " + problem, file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from chat_memory import estimate_tokens
+from metrics import COUNT_BUCKETS, TOKEN_BUCKETS, registry
+
+# --- Instrumentación del ciclo ReAct ---
+# Callback que mide cada llamada al LLM (latencia, tokens de entrada y salida) y cuenta las
+# iteraciones del agente en un turno. Las herramientas y el HTTP se miden aparte con
+# registry.timed (agente.py) y en http_client.py; todo acaba en los histogramas de metrics.py.
+
+
+def prompt_tokens(prompts: list) -> int:
+    """Tokens estimados de los prompts de on_llm_start."""
+    return sum(estimate_tokens(p) for p in prompts)
+
+
+def message_tokens(messages: list) -> int:
+    """Tokens estimados de los lotes de mensajes de on_chat_model_start."""
+    return sum(estimate_tokens(str(m.content)) for batch in messages for m in batch)
+
+
+def response_usage(response) -> tuple:
+    """(tokens de entrada, tokens de salida) que informa Gemini en la respuesta. Sin uso
+    informado, la salida se estima del texto y la entrada queda a 0."""
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+            elif generation.text:
+                output_tokens += estimate_tokens(generation.text)
+    return input_tokens, output_tokens
+
+
+class InstrumentationHandler(BaseCallbackHandler):
+    """Un handler por turno del agente; vuelca sus medidas en `metrics.registry`."""
+
+    def __init__(self, model: str = "?"):
+        self.model = model
+        self.iterations = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self._llm_started = {}
+        self._prompt_tokens = {}
+
+    def _start(self, run_id, prompt_tokens: int) -> None:
+        self._llm_started[run_id] = time.perf_counter()
+        self._prompt_tokens[run_id] = prompt_tokens
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._start(run_id, prompt_tokens(prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start(run_id, message_tokens(messages))
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        elapsed = self._finish(run_id, "ok")
+        if elapsed is None:
+            return
+        input_tokens, output_tokens = response_usage(response)
+        # Sin uso informado por Gemini nos quedamos con la estimación del prompt
+        input_tokens = input_tokens or self._prompt_tokens.pop(run_id, 0)
+        self._prompt_tokens.pop(run_id, None)
+        registry.observe("llm_input_tokens", input_tokens, TOKEN_BUCKETS, model=self.model)
+        registry.observe("llm_output_tokens", output_tokens, TOKEN_BUCKETS, model=self.model)
+        if output_tokens and elapsed:
+            registry.observe("llm_seconds_per_output_token", elapsed / output_tokens, model=self.model)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._finish(run_id, "error")
+        self._prompt_tokens.pop(run_id, None)
+
+    def _finish(self, run_id, outcome: str):
+        started = self._llm_started.pop(run_id, None)
+        if started is None:
+            return None
+        elapsed = time.perf_counter() - started
+        self.llm_calls += 1
+        self.llm_seconds += elapsed
+        registry.observe("llm_call_seconds", elapsed, model=self.model, outcome=outcome)
+        return elapsed
+
+    def on_agent_action(self, action, **kwargs) -> None:
+        self.iterations += 1
+
+    def on_agent_finish(self, finish, **kwargs) -> None:
+        registry.observe("agent_iterations", self.iterations, COUNT_BUCKETS, model=self.model)
+        registry.observe("agent_llm_seconds", self.llm_seconds, model=self.model)
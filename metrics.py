@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# --- Métricas en proceso ---
+# Histogramas de latencia (LLM, herramientas, HTTP por host), contadores y gauges que se
+# leen al exportar (ratios de acierto de las cachés, estado de los breakers). Todo vive en
+# memoria del proceso y se exporta en texto Prometheus o en JSON lines. Sin dependencias:
+# se importa desde http_client.py y los módulos de caché.
+
+PREFIX = "meteorologia_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Histograma de buckets fijos (como los de Prometheus) con percentiles interpolados."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q: float):
+        with self._lock:
+            counts, total, peak = list(self.counts), self.count, self.max
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else peak
+                return min(peak, lower + (upper - lower) * (rank - seen) / n)
+            seen += n
+        return peak
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, value_sum, peak = list(self.counts), self.count, self.sum, self.max
+        cumulative, running = [], 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        return {
+            "count": total,
+            "sum": value_sum,
+            "max": peak,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], cumulative)),
+        }
+
+
+class MetricsRegistry:
+    """Registro de histogramas, contadores y gauges por (nombre, etiquetas)."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            return self._histograms[key]
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels) -> None:
+        self.histogram(name, buckets, **labels).observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, fn, **labels) -> None:
+        """Registra un gauge que se calcula al exportar llamando a fn()."""
+        with self._lock:
+            self._gauges[(name, _labels_key(labels))] = fn
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels):
+        """Decorador: mide cada llamada de la función en el histograma `name`."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _read_gauges(self) -> list:
+        with self._lock:
+            gauges = list(self._gauges.items())
+        values = []
+        for (name, labels), fn in gauges:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            if value is not None:
+                values.append((name, labels, float(value)))
+        return values
+
+    def snapshot(self) -> dict:
+        """Estado actual: {"histograms": [...], "counters": [...], "gauges": [...]}."""
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+        return {
+            "histograms": [{"name": n, "labels": dict(l), **h.snapshot()} for (n, l), h in sorted(histograms, key=lambda x: x[0])],
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters)],
+            "gauges": [{"name": n, "labels": dict(l), "value": v} for n, l, v in sorted(self._read_gauges())],
+        }
+
+    def to_prometheus(self) -> str:
+        """Exposición en formato de texto de Prometheus."""
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda x: x[0])
+            counters = sorted(self._counters.items())
+        lines, typed = [], set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), h in histograms:
+            metric = PREFIX + name
+            declare(metric, "histogram")
+            snap = h.snapshot()
+            for le, n in snap["buckets"].items():
+                lines.append(f"{metric}_bucket{_prom_labels(labels, (('le', le),))} {n}")
+            lines.append(f"{metric}_sum{_prom_labels(labels)} {snap['sum']}")
+            lines.append(f"{metric}_count{_prom_labels(labels)} {snap['count']}")
+        for (name, labels), value in counters:
+            metric = PREFIX + name
+            declare(metric, "counter")
+            lines.append(f"{metric}{_prom_labels(labels)} {value}")
+        for name, labels, value in sorted(self._read_gauges()):
+            metric = PREFIX + name
+            declare(metric, "gauge")
+            lines.append(f"{metric}{_prom_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        """Una línea JSON por serie, con marca de tiempo (para volcar a fichero o a logs)."""
+        ts = round(time.time(), 3)
+        snap = self.snapshot()
+        lines = []
+        for kind in ("histograms", "counters", "gauges"):
+            for series in snap[kind]:
+                lines.append(json.dumps({"ts": ts, "type": kind[:-1], **series}, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """Añade el estado actual en JSON lines al fichero `path`."""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_json_lines())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,74 @@
+from langchain_core.callbacks import BaseCallbackHandler
+
+from instrumentation import message_tokens, prompt_tokens, response_usage
+
+# --- Observaciones compactas para el LLM ---
+# Las herramientas devuelven informes Markdown con emojis pensados para el usuario, pero en
+# el ReAct cada Observation se reenvía a Gemini en todos los pasos siguientes. En modo
+# compacto el LLM recibe clave=valor con nombres cortos y números redondeados; el Markdown
+# rico queda para la UI (fast-path) y para la respuesta final que redacta el propio modelo.
+
+
+def _num(value):
+    if isinstance(value, (int, float)):
+        return round(value)
+    return "?" if value in (None, "", "N/A") else value
+
+
+def compact_weather(place: dict, weather_res: dict) -> str:
+    """Ej: 'wx lugar=Madrid,España t=21 st=20 hr=45 v=12 max=25 min=12 sol=07:58-19:12'
+    (t/st/max/min en °C, hr en %, v en km/h)."""
+    current = weather_res.get("current", {})
+    daily = weather_res.get("daily", {})
+    fields = [
+        f"lugar={place['name']},{place.get('country', '')}",
+        f"t={_num(current.get('temperature_2m'))}",
+        f"st={_num(current.get('apparent_temperature'))}",
+        f"hr={_num(current.get('relative_humidity_2m'))}",
+        f"v={_num(current.get('wind_speed_10m'))}",
+    ]
+    if daily and "temperature_2m_max" in daily:
+        fields.append(f"max={_num(daily['temperature_2m_max'][0])}")
+        fields.append(f"min={_num(daily['temperature_2m_min'][0])}")
+        sunrise = (daily.get("sunrise") or [""])[0][-5:]
+        sunset = (daily.get("sunset") or [""])[0][-5:]
+        if sunrise and sunset:
+            fields.append(f"sol={sunrise}-{sunset}")
+    return "wx " + " ".join(fields)
+
+
+def compact_alerts(location: str, warnings: list, stale: bool = False) -> str:
+    """Ej: 'aemet lugar=Valencia n=1 | amarillo Lluvias @Litoral sur de Valencia z=774602 18/10T12-19/10T00'."""
+    head = f"aemet lugar={location} n={len(warnings)}" + (" boletin=antiguo" if stale else "")
+    items = []
+    for w in warnings:
+        onset = w.onset.strftime("%d/%mT%H") if w.onset else "?"
+        expires = w.expires.strftime("%d/%mT%H") if w.expires else "?"
+        items.append(f"{w.level} {w.phenomenon} @{w.area} z={w.zone} {onset}-{expires}")
+    return " | ".join([head] + items)
+
+
+class PromptSizeHandler(BaseCallbackHandler):
+    """Cuenta llamadas al LLM y tokens de prompt de un turno completo del agente."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.reported_tokens = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.llm_calls += 1
+        self.prompt_tokens += prompt_tokens(prompts)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.llm_calls += 1
+        self.prompt_tokens += message_tokens(messages)
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        # Si Gemini informa del uso real lo preferimos a la estimación
+        self.reported_tokens += response_usage(response)[0]
+
+    def summary(self) -> str:
+        tokens = self.reported_tokens or self.prompt_tokens
+        source = "" if self.reported_tokens else "~"
+        return f"📏 {self.llm_calls} llamadas al LLM · {source}{tokens} tokens de prompt en este turno"
@@ -0,0 +1,72 @@
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+# --- Ejecución concurrente de herramientas ---
+# El formato ReAct solo permite una Action por paso. La herramienta "run_parallel" deja que
+# el modelo pida varias invocaciones independientes en un único paso (p. ej. clima + alertas):
+# se ejecutan a la vez y las observaciones vuelven en el orden pedido.
+# El turno tarda lo que la herramienta más lenta, no la suma, y ahorra pasos del LLM.
+# Cada invocación tiene su propio pool (un hilo por llamada): una sesión no espera en cola
+# a las herramientas lentas de otra. La concurrencia contra las APIs la acotan el pool de
+# http_client.py, los breakers y el single-flight.
+
+MAX_CALLS = 8
+CALL_TIMEOUT = 30
+
+
+def parse_calls(text: str) -> list:
+    """Acepta una lista JSON [{"tool": ..., "input": ...}] o líneas "herramienta: input"
+    separadas por saltos de línea, ';' o '|'."""
+    text = text.strip().strip("`")
+    if text.startswith("["):
+        try:
+            return [(str(c["tool"]).strip(), str(c.get("input", "")).strip()) for c in json.loads(text)]
+        except (ValueError, KeyError, TypeError):
+            pass
+    calls = []
+    for chunk in re.split(r"[\n;|]", text):
+        name, sep, arg = chunk.partition(":")
+        if sep and name.strip():
+            calls.append((name.strip(), arg.strip().strip("'\"")))
+    return calls
+
+
+def run_parallel(text: str, tools: list) -> str:
+    """Ejecuta concurrentemente las llamadas descritas en `text` sobre `tools` (objetos Tool)."""
+    funcs = {tool.name: tool.func for tool in tools}
+    calls = parse_calls(text)
+    if not calls:
+        return "Formato no válido. Usa: herramienta: input; herramienta: input (ej: get_weather: Valencia; check_aemet_alerts: Valencia)."
+
+    skipped = calls[MAX_CALLS:]
+    calls = calls[:MAX_CALLS]
+    pool = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="tool-call")
+    futures = []
+    for name, arg in calls:
+        func = funcs.get(name)
+        if func is None:
+            futures.append(None)
+            continue
+        futures.append(pool.submit(func, arg))
+    # Una llamada colgada no bloquea el turno: no esperamos a sus hilos al salir
+    pool.shutdown(wait=False)
+
+    # Un único plazo para todo el lote, contado desde que arrancan las llamadas
+    deadline = time.monotonic() + CALL_TIMEOUT
+    observations = []
+    for (name, arg), future in zip(calls, futures):
+        if future is None:
+            result = f"Herramienta desconocida '{name}'. Disponibles: {', '.join(funcs)}."
+        else:
+            try:
+                result = future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                result = f"Error ejecutando {name}: sin respuesta tras {CALL_TIMEOUT} s."
+            except Exception as e:
+                result = f"Error ejecutando {name}: {str(e) or type(e).__name__}"
+        observations.append(f"[{name}({arg})]\n{result}")
+    if skipped:
+        observations.append(f"Máximo {MAX_CALLS} llamadas por paso; no ejecutadas: {', '.join(n for n, _ in skipped)}.")
+    return "\n\n".join(observations)
@@ -0,0 +1,197 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aemet import warnings_store
+from forecast import fetch_forecast, forecast_cache, forecast_key, next_refresh
+from forecast_engine import SERIES_REQUEST
+from gazetteer import resolve_place
+from geocoding import normalize_location
+from metrics import registry
+
+# --- Prefetch / warm-up de ubicaciones populares ---
+# Las cachés solo se llenan cuando alguien pregunta, así que el primer usuario tras cada
+# caducidad paga la latencia completa. Este planificador cuenta qué ubicaciones se consultan
+# (con decaimiento exponencial) y, justo al cruzar cada frontera de actualización de
+# Open-Meteo, refresca el pronóstico de las N más populares antes de que nadie lo pida:
+# el actual (get_weather) o las series horarias de 7 días (get_forecast), según lo consultado.
+# Con avisos AEMET recientes, también adelanta el refresco del boletín.
+
+TOP_N = int(os.environ.get("METEOROLOGIA_PREFETCH_TOP_N", "20"))
+CONCURRENCY = int(os.environ.get("METEOROLOGIA_PREFETCH_CONCURRENCY", "4"))
+# Máximo de peticiones upstream por ronda de prefetch
+BUDGET = int(os.environ.get("METEOROLOGIA_PREFETCH_BUDGET", "30"))
+
+HALF_LIFE = 3600
+# Ubicaciones seguidas como máximo y puntuación por debajo de la cual se olvidan
+# (una consulta suelta cae a 0.05 en ~4,3 vidas medias)
+MAX_TRACKED = 2000
+MIN_SCORE = 0.05
+# Segundos tras la frontera en los que arranca la ronda (margen para que Open-Meteo publique)
+BOUNDARY_OFFSET = 2.0
+# Antelación con la que se refresca el boletín AEMET respecto a su intervalo
+AEMET_LEAD = 60
+
+
+class LocationPopularity:
+    """Contador por ubicación normalizada con decaimiento exponencial (vida media HALF_LIFE).
+    Acotado: las entradas despreciables se olvidan y nunca se siguen más de `max_tracked`."""
+
+    def __init__(self, half_life: float = HALF_LIFE, max_tracked: int = MAX_TRACKED):
+        self.decay = math.log(2) / half_life
+        self.max_tracked = max_tracked
+        self._scores = {}  # clave -> (puntuación, instante, texto original)
+        self._lock = threading.Lock()
+
+    def record(self, location: str) -> None:
+        key = normalize_location(location)
+        now = time.time()
+        with self._lock:
+            score, at, _ = self._scores.get(key, (0.0, now, location))
+            self._scores[key] = (score * math.exp(-self.decay * (now - at)) + 1.0, now, location)
+            if len(self._scores) > self.max_tracked:
+                self._prune(now)
+
+    def _decayed(self, now: float) -> list:
+        return [(score * math.exp(-self.decay * (now - at)), key, location)
+                for key, (score, at, location) in self._scores.items()]
+
+    def _prune(self, now: float) -> None:
+        # Fuera lo despreciable y, si aún sobra, se quedan las 3/4 partes más populares
+        # (así la poda no se repite en cada consulta nueva)
+        ranked = sorted((e for e in self._decayed(now) if e[0] >= MIN_SCORE), reverse=True)
+        keep = {key for _, key, _ in ranked[:self.max_tracked * 3 // 4]}
+        self._scores = {key: entry for key, entry in self._scores.items() if key in keep}
+
+    def top(self, n: int) -> list:
+        now = time.time()
+        with self._lock:
+            ranked = sorted(((score, location) for score, _, location in self._decayed(now)), reverse=True)
+        return [location for _, location in ranked[:n]]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class PrefetchScheduler:
+    """Hilo de fondo que mantiene calientes pronósticos y boletín para las ubicaciones top-N."""
+
+    def __init__(self, top_n: int = TOP_N, concurrency: int = CONCURRENCY, budget: int = BUDGET):
+        self.top_n = top_n
+        self.budget = budget
+        self.weather = LocationPopularity()
+        self.forecast = LocationPopularity()
+        self.alerts = LocationPopularity()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prefetch")
+        self._thread = None
+        self._lock = threading.Lock()
+        # Los hilos del pool y el del bucle actualizan las estadísticas a la vez
+        self._stats_lock = threading.Lock()
+        self.stats = {"rounds": 0, "refreshed": 0, "skipped_budget": 0, "errors": 0, "bulletin_refreshes": 0,
+                      "lag_samples": 0, "last_lag": None, "max_lag": 0.0, "total_lag": 0.0}
+
+    def record(self, location: str, kind: str = "weather") -> None:
+        """Anota una consulta de usuario (kind: 'weather', 'forecast' o 'alerts') y arranca el hilo si hace falta."""
+        {"alerts": self.alerts, "forecast": self.forecast}.get(kind, self.weather).record(location)
+        self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            # Dormimos hasta la siguiente frontera de actualización (15 min) o hasta que toque el boletín
+            now = time.time()
+            wake_at = next_refresh(now, True) + BOUNDARY_OFFSET
+            if len(self.alerts) and warnings_store.updated_at:
+                wake_at = min(wake_at, warnings_store.updated_at + warnings_store.refresh_interval - AEMET_LEAD)
+            time.sleep(max(1.0, wake_at - now))
+            try:
+                self.run_once()
+            except Exception:
+                self._count("errors")
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def run_once(self) -> None:
+        self._count("rounds")
+        budget = self.budget
+        futures = []
+        # Cada tipo de consulta calienta su propia entrada de caché
+        for popularity, request in ((self.weather, {}), (self.forecast, SERIES_REQUEST)):
+            for location in popularity.top(self.top_n):
+                try:
+                    # Normalmente sale del nomenclátor o de la caché de geocoding, sin red
+                    place = resolve_place(location)
+                except Exception:
+                    self._count("errors")
+                    continue
+                if place is None:
+                    continue
+                key = forecast_key(place["latitude"], place["longitude"], **request)
+                expires_at = forecast_cache.expires_at(key)
+                if expires_at is not None and expires_at > time.time():
+                    continue
+                if budget <= 0:
+                    self._count("skipped_budget")
+                    continue
+                budget -= 1
+                futures.append(self._pool.submit(self._refresh_forecast, place, expires_at, request))
+
+        if len(self.alerts) and warnings_store.updated_at and budget > 0:
+            age = time.time() - warnings_store.updated_at
+            if age >= warnings_store.refresh_interval - AEMET_LEAD:
+                budget -= 1
+                futures.append(self._pool.submit(self._refresh_bulletin))
+
+        for future in futures:
+            future.result()
+
+    def _record_lag(self, lag: float) -> None:
+        # Lag = cuánto después de caducar quedó refrescado (negativo si fue antes)
+        with self._stats_lock:
+            self.stats["lag_samples"] += 1
+            self.stats["last_lag"] = lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            self.stats["total_lag"] += lag
+
+    def _refresh_forecast(self, place: dict, expires_at, request: dict) -> None:
+        try:
+            fetch_forecast(place["latitude"], place["longitude"], force=True, **request)
+        except Exception:
+            self._count("errors")
+            return
+        self._count("refreshed")
+        if expires_at is not None:
+            self._record_lag(time.time() - expires_at)
+
+    def _refresh_bulletin(self) -> None:
+        try:
+            warnings_store.refresh()
+        except Exception:
+            self._count("errors")
+            return
+        self._count("bulletin_refreshes")
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        samples = stats["lag_samples"]
+        return {
+            **stats,
+            "avg_lag": stats["total_lag"] / samples if samples else None,
+            "tracked_weather": len(self.weather),
+            "tracked_forecast": len(self.forecast),
+            "tracked_alerts": len(self.alerts),
+        }
+
+
+prefetcher = PrefetchScheduler()
+registry.gauge("prefetch_refresh_lag_seconds", lambda: prefetcher.metrics()["last_lag"])
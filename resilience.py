@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from metrics import registry
+
+# --- Circuit breakers y peticiones "hedged" ---
+# Un upstream degradado (AEMET puede tardar 10 s + 15 s por consulta) no debe bloquear cada
+# turno: tras varios fallos o respuestas lentas el breaker se abre y las llamadas fallan al
+# instante hacia el fallback; pasado un tiempo deja pasar una sonda (half-open) para ver si
+# se ha recuperado. En Open-Meteo, opcionalmente, si una petición tarda más que el p95
+# reciente se lanza una segunda en paralelo y gana la primera que responda. Los duplicados
+# tienen presupuesto (una fracción de las llamadas): con el upstream lento no se dobla la carga.
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+HEDGING_ENABLED = os.environ.get("METEOROLOGIA_HEDGE", "1") == "1"
+
+# Como mucho un duplicado por cada 10 llamadas, con ráfagas de hasta 3
+HEDGE_RATIO = 0.1
+HEDGE_BURST = 3
+
+
+class CircuitOpenError(Exception):
+    """El upstream está marcado como caído: no se intenta la llamada."""
+
+
+class LatencyTracker:
+    """Ventana de latencias recientes para estimar percentiles."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float, default: float = None):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 10:
+            return default
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgeBudget:
+    """Fichas para duplicados: cada llamada aporta `ratio` (hasta `burst`) y cada hedge gasta una."""
+
+    def __init__(self, name: str, ratio: float = HEDGE_RATIO, burst: float = HEDGE_BURST):
+        self.name = name
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def available(self) -> bool:
+        return self.tokens >= 1
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+        registry.inc("hedges_total", upstream=self.name)
+        return True
+
+
+class CircuitBreaker:
+    """Breaker por upstream: abre tras `failure_threshold` fallos (o llamadas más lentas que
+    `slow_threshold`) consecutivos y vuelve a probar pasados `reset_timeout` segundos."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_threshold: float = 5.0,
+                 reset_timeout: float = 30.0, ignore=()):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_threshold = slow_threshold
+        self.reset_timeout = reset_timeout
+        # Excepciones que no indican un upstream caído (p. ej. API key inválida)
+        self.ignore = ignore
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget(name)
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+        registry.gauge("circuit_state", lambda: STATE_VALUES[self.state], upstream=name)
+
+    def _before_call(self) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"{self.name} no está disponible temporalmente (circuit breaker abierto).")
+            if self.state == HALF_OPEN:
+                self._probing = True
+
+    def _on_result(self, ok: bool, elapsed: float) -> None:
+        with self._lock:
+            self._probing = False
+            slow = elapsed > self.slow_threshold
+            if slow:
+                self.stats["slow"] += 1
+            if ok and not slow:
+                self.failures = 0
+                self.state = CLOSED
+                return
+            if not ok:
+                self.stats["failures"] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.stats["opened"] += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        self._before_call()
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except self.ignore:
+            self._on_result(True, time.monotonic() - start)
+            raise
+        except Exception:
+            self._on_result(False, time.monotonic() - start)
+            raise
+        elapsed = time.monotonic() - start
+        self.latency.add(elapsed)
+        # Una respuesta lenta se entrega, pero cuenta para abrir el breaker
+        self._on_result(True, elapsed)
+        return result
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "state": self.state,
+            "p95": self.latency.percentile(0.95),
+        }
+
+
+def _spawn(fn, args) -> Future:
+    # Un hilo propio por petición: nada de cola compartida que retrase la primaria más allá del p95
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return future
+
+
+def hedged(fn, args=(), delay: float = None, budget: HedgeBudget = None):
+    """Ejecuta fn(*args); si no ha respondido en `delay` segundos y queda presupuesto, lanza
+    un duplicado y devuelve el primer resultado correcto. Sin `delay` ni presupuesto, la
+    llamada se hace tal cual en el hilo del que llama."""
+    if budget is not None:
+        budget.deposit()
+    if delay is None or (budget is not None and not budget.available()):
+        return fn(*args)
+    first = _spawn(fn, args)
+    try:
+        return first.result(timeout=delay)
+    except FutureTimeout:
+        pass
+    if budget is not None and not budget.try_spend():
+        return first.result()
+    pending = {first, _spawn(fn, args)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+_breakers = {
+    "aemet": CircuitBreaker("aemet", failure_threshold=3, slow_threshold=8.0, reset_timeout=60.0),
+    "open-meteo": CircuitBreaker("open-meteo", failure_threshold=5, slow_threshold=3.0, reset_timeout=15.0),
+}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def protected_call(name: str, fn, *args, hedge: bool = False):
+    """Llama a un upstream a través de su breaker y, si `hedge`, con hedging tras el p95."""
+    cb = breaker(name)
+    delay = cb.latency.percentile(0.95, default=None) if hedge and HEDGING_ENABLED else None
+    if delay is not None:
+        delay = max(delay, 0.05)
+    return cb.call(hedged, fn, args, delay, cb.hedge_budget)
+
+
+def all_metrics() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {cb.name: cb.metrics() for cb in breakers}
@@ -0,0 +1,112 @@
+import re
+from typing import NamedTuple
+
+from aemet import ALIAS_PROVINCIA, PROVINCIAS
+from gazetteer import get_gazetteer
+from geocoding import normalize_location
+
+# --- Router de intenciones (fast-path) ---
+# Las preguntas simples ("¿qué hora es?", "tiempo en Sevilla") no necesitan el ciclo ReAct:
+# detectamos la intención con patrones, llamamos a la herramienta directamente y pintamos
+# la respuesta con una plantilla. Solo lo dudoso pasa al agente (y a Gemini).
+
+CONFIDENCE_THRESHOLD = 0.8
+
+# Nombres que reconocemos sin dudar: provincias, capitales y alias
+GAZETTEER = {normalize_location(name) for name in PROVINCIAS.values()} | set(ALIAS_PROVINCIA)
+
+# Matices que el router no sabe responder con una plantilla: mejor que lo razone el agente
+COMPLEX_CUES = re.compile(
+    r"\b(manana|pasado|semana|finde|fin de semana|luego|tarde|noche|compar\w*|llover\w*|llueve|"
+    r"lunes|martes|miercoles|jueves|viernes|sabado|domingo|"
+    r"recomiend\w*|deberia|ropa|paraguas|por que|mejor|peor|y|o)\b"
+)
+
+# Lugares que no están en el nomenclátor: por debajo del umbral, los decide el agente
+UNKNOWN_PLACE_CONFIDENCE = 0.6
+
+# Observaciones de error o de respaldo (búsqueda web, lugar no encontrado): no se pintan con
+# plantilla, las contesta el agente
+FALLBACK_PREFIXES = ("Error", "Ocurrió", "⚠️", "No encontré", "No hay datos")
+
+# La ubicación nunca empieza por "hoy"/"ahora" ("clima de hoy en Bilbao" -> "bilbao")
+_LOC = r"(?!(?:hoy|ahora)\b)(?P<loc>[a-z0-9' .-]+?)"
+_WHEN = r"(?: (?:de |para )?(?:hoy|ahora|ahora mismo))?"
+
+PATTERNS = {
+    "time": [
+        re.compile(r"^(?:que hora es|dime la hora|que dia es hoy|que dia es|que fecha es hoy|a que dia estamos)(?: hoy)?(?: por favor)?$"),
+    ],
+    "weather": [
+        re.compile(rf"^(?:que |como )?(?:tiempo|clima|temperatura)(?: (?:hace|hay))?{_WHEN} (?:en|de|para) {_LOC}{_WHEN}$"),
+        re.compile(rf"^como (?:esta|va) (?:el )?(?:tiempo|clima){_WHEN} en {_LOC}{_WHEN}$"),
+        re.compile(rf"^(?:cuantos grados|que temperatura) (?:hace|hay){_WHEN} en {_LOC}{_WHEN}$"),
+    ],
+    "alerts": [
+        re.compile(
+            rf"^(?:hay )?(?:alguna |algun )?(?:alertas?|avisos?)(?: meteorologic[oa]s?)?(?: de aemet)?"
+            rf"(?: activ[oa]s?| vigentes?)?{_WHEN} (?:en|para) {_LOC}{_WHEN}$"
+        ),
+    ],
+}
+
+
+class Intent(NamedTuple):
+    name: str
+    location: str
+    confidence: float
+
+
+def _clean(text: str) -> str:
+    text = re.sub(r"[¿?¡!,;:]", " ", normalize_location(text))
+    return " ".join(text.split()).strip(" .")
+
+
+def _known_place(location: str) -> bool:
+    if location in GAZETTEER:
+        return True
+    gazetteer = get_gazetteer()
+    return gazetteer is not None and bool(gazetteer.exact(location))
+
+
+def detect_intent(text: str):
+    """Devuelve la intención más probable (o None) con una confianza en [0, 1]."""
+    clean = _clean(text)
+    for name, patterns in PATTERNS.items():
+        for pattern in patterns:
+            match = pattern.match(clean)
+            if not match:
+                continue
+            if name == "time":
+                return Intent(name, "", 1.0)
+            location = match.group("loc").strip()
+            if COMPLEX_CUES.search(location):
+                return Intent(name, location, 0.3)
+            confidence = 1.0 if _known_place(location) else UNKNOWN_PLACE_CONFIDENCE
+            if len(location.split()) > 4:
+                confidence -= 0.3
+            return Intent(name, location, confidence)
+    return None
+
+
+def render(intent: Intent, observation: str) -> str:
+    """Plantillas de respuesta para cada intención (sustituyen al 'Final Answer' del LLM)."""
+    if intent.name == "time":
+        date, _, clock = observation.partition(" ")
+        return f"🕒 Son las **{clock[:5]}** del **{date}**."
+    if intent.name == "weather":
+        return f"Aquí tienes el tiempo ahora mismo:\n\n{observation}"
+    return observation
+
+
+def route(text: str, handlers: dict, threshold: float = CONFIDENCE_THRESHOLD):
+    """Responde directamente si la intención es clara y la herramienta contesta; None para
+    delegar en el agente. handlers: {"time": fn(), "weather": fn(location), "alerts": fn(location)}."""
+    intent = detect_intent(text)
+    if intent is None or intent.confidence < threshold or intent.name not in handlers:
+        return None
+    handler = handlers[intent.name]
+    observation = handler() if intent.name == "time" else handler(intent.location)
+    if observation.startswith(FALLBACK_PREFIXES):
+        return None
+    return render(intent, observation)
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+
+from geocoding import normalize_location
+from metrics import registry
+from singleflight import group
+
+# --- Búsqueda web con control de rate-limit ---
+# DuckDuckGo corta con "202 Ratelimit" en cuanto se le pregunta demasiado (ver search_log.txt).
+# Cada backend (lite/html/api) tiene su token bucket y una puntuación de salud; se prueba
+# primero el más sano y se rota al siguiente si falla. Los resultados se cachean por
+# consulta normalizada: el fallback de AEMET repite las mismas búsquedas una y otra vez.
+
+BACKENDS = ("lite", "html", "api")
+
+SEARCH_TTL = 15 * 60
+RATELIMIT_COOLDOWN = 60
+
+
+class TokenBucket:
+    """Limitador clásico: `rate` peticiones/segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class BackendHealth:
+    """Puntuación de salud (media móvil de éxitos) y enfriamiento tras un rate-limit.
+    La actualizan a la vez los hilos de todas las sesiones: va protegida por un lock."""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.score = 1.0
+        self.cooldown_until = 0.0
+        self.stats = {"ok": 0, "errors": 0, "ratelimited": 0, "throttled": 0}
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, ratelimited: bool = False) -> None:
+        with self._lock:
+            self.score = (1 - self.alpha) * self.score + self.alpha * (1.0 if ok else 0.0)
+            if ok:
+                self.stats["ok"] += 1
+            elif ratelimited:
+                self.stats["ratelimited"] += 1
+                self.cooldown_until = time.monotonic() + RATELIMIT_COOLDOWN
+            else:
+                self.stats["errors"] += 1
+
+    def throttled(self) -> None:
+        with self._lock:
+            self.stats["throttled"] += 1
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def cooldown_left(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"score": round(self.score, 3), "cooling_down": not self.available(), **self.stats}
+
+
+class WebSearch:
+    """Búsqueda DuckDuckGo con caché TTL, rotación de backends y cliente reutilizable."""
+
+    def __init__(self, backends=BACKENDS, rate: float = 0.5, burst: float = 3, ttl: float = SEARCH_TTL, maxsize: int = 256):
+        self.backends = tuple(backends)
+        self.buckets = {b: TokenBucket(rate, burst) for b in self.backends}
+        self.health = {b: BackendHealth() for b in self.backends}
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Un cliente DDGS de larga vida por hilo (no está garantizado que sea thread-safe)
+        self._local = threading.local()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from duckduckgo_search import DDGS
+            client = self._local.client = DDGS()
+        return client
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.time() - entry[1] < self.ttl:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+            return None
+
+    def _store(self, key, results) -> None:
+        with self._lock:
+            self._cache[key] = (results, time.time())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def text(self, query: str, max_results: int = 3) -> list:
+        """Resultados [{title, href, body}] para `query`. Lanza la última excepción si
+        todos los backends fallan o están limitados."""
+        key = (normalize_location(query), max_results)
+        results = self._cached(key)
+        if results is not None:
+            return results
+        return group("search").do(key, self._fetch, key, query, max_results)
+
+    def _ranked_backends(self) -> list:
+        return sorted(self.backends, key=lambda b: self.health[b].score, reverse=True)
+
+    def _fetch(self, key, query: str, max_results: int) -> list:
+        last_error = None
+        for backend in self._ranked_backends():
+            health = self.health[backend]
+            if not health.available() or not self.buckets[backend].try_acquire():
+                health.throttled()
+                continue
+            try:
+                with registry.timer("search_backend_seconds", backend=backend):
+                    results = list(self._client().text(query, max_results=max_results, backend=backend))
+            except Exception as e:
+                health.record(False, ratelimited="ratelimit" in str(e).lower() or type(e).__name__ == "RatelimitException")
+                last_error = e
+                continue
+            health.record(True)
+            if results:
+                self._store(key, results)
+            return results
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("Todos los backends de búsqueda están limitados; inténtalo en unos segundos.")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def hit_ratio(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def metrics(self) -> dict:
+        return {
+            "cache": dict(self.stats),
+            "backends": {b: h.snapshot() for b, h in self.health.items()},
+        }
+
+    def register_metrics(self) -> None:
+        """Salud de cada backend como gauges: puntuación, enfriamiento restante y contadores."""
+        for backend, health in self.health.items():
+            registry.gauge("search_backend_score", lambda h=health: h.score, backend=backend)
+            registry.gauge("search_backend_cooldown_seconds", health.cooldown_left, backend=backend)
+            for outcome in health.stats:
+                registry.gauge("search_backend_requests", lambda h=health, o=outcome: h.stats[o], backend=backend, outcome=outcome)
+
+
+web_search = WebSearch()
+registry.gauge("cache_hit_ratio", web_search.hit_ratio, cache="search")
+web_search.register_metrics()
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine import Engine, EngineConfig, config_from_env
+from gazetteer import ensure_gazetteer
+from metrics import registry
+from search import web_search
+from singleflight import all_metrics as singleflight_metrics
+
+# --- Servicio sin interfaz y modo batch ---
+# El mismo motor que la app de Streamlit (engine.py) detrás de una API HTTP/JSON local o
+# procesando un fichero JSONL de preguntas. Cada petición trae su configuración explícita
+# (sobre la base del entorno) y un session_id opcional para la memoria de conversación.
+# Para escalar se lanzan varios procesos (serve en varios puertos tras un balanceador con
+# afinidad por sesión, o batch --processes N).
+#
+#   python service.py serve --port 8765 --workers 16
+#   curl -s localhost:8765/ask -d '{"question": "¿Qué tiempo hace en Bilbao?", "session_id": "u1"}'
+#   python service.py batch preguntas.jsonl respuestas.jsonl --workers 8 --processes 2
+
+# Campos de EngineConfig que una petición puede fijar; el resto sale del entorno
+REQUEST_FIELDS = set(EngineConfig._fields)
+
+
+def request_config(base: EngineConfig, overrides: dict) -> EngineConfig:
+    """Config de una petición: la base del proceso con los campos que traiga la petición."""
+    overrides = {k: v for k, v in (overrides or {}).items() if k in REQUEST_FIELDS and v is not None}
+    return base._replace(**overrides)
+
+
+def handle_request(engine: Engine, base: EngineConfig, request: dict) -> dict:
+    """Procesa {"question", "session_id"?, "config"?, "id"?}; los errores van en la respuesta."""
+    if not isinstance(request, dict):
+        return {"error": "Cada petición debe ser un objeto JSON."}
+    question = request.get("question")
+    question = question.strip() if isinstance(question, str) else ""
+    out = {"id": request.get("id")} if "id" in request else {}
+    if not question:
+        return {**out, "error": "Falta 'question'."}
+    try:
+        config = request_config(base, request.get("config"))
+        if not config.google_api_key:
+            return {**out, "error": "Falta la Google API Key (GOOGLE_API_KEY o config.google_api_key)."}
+        return {**out, **engine.ask(question, request.get("session_id"), config)}
+    except Exception as e:
+        registry.inc("service_errors_total", kind=type(e).__name__)
+        return {**out, "session_id": request.get("session_id"), "error": str(e)}
+
+
+# --- API HTTP ---
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: str, content_type: str = "application/json") -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, status: int, payload) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False))
+
+    def do_GET(self):
+        if self.path == "/health":
+            return self._json(200, {"status": "ok", **self.server.engine.metrics(), "singleflight": singleflight_metrics(),
+                                    "search": web_search.metrics()})
+        if self.path == "/metrics":
+            return self._send(200, registry.to_prometheus(), "text/plain; version=0.0.4")
+        return self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        engine, base = self.server.engine, self.server.base_config
+        if self.path == "/reset":
+            try:
+                engine.reset(json.loads(body or "{}").get("session_id", ""))
+            except (ValueError, AttributeError):
+                return self._json(400, {"error": "JSON inválido"})
+            return self._json(200, {"ok": True})
+        if self.path != "/ask":
+            return self._json(404, {"error": "not found"})
+
+        # Un objeto JSON por petición (aunque venga formateado en varias líneas), o JSON lines
+        # (una pregunta por línea, o Content-Type application/x-ndjson) con respuesta en JSON lines
+        content_type = self.headers.get("Content-Type") or ""
+        ndjson = "ndjson" in content_type or "jsonl" in content_type
+        try:
+            requests_ = None if ndjson else [json.loads(body or "{}")]
+        except ValueError:
+            requests_ = None
+        if requests_ is None:
+            try:
+                requests_ = [json.loads(line) for line in body.splitlines() if line.strip()]
+            except ValueError:
+                return self._json(400, {"error": "JSON inválido"})
+            ndjson = True
+        with self.server.slots:
+            results = [handle_request(engine, base, r) for r in requests_]
+        if ndjson:
+            return self._send(200, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results), "application/x-ndjson")
+        status = 200 if "error" not in results[0] else 400
+        return self._json(status, results[0])
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = 16, engine: Engine = None,
+          base_config: EngineConfig = None) -> None:
+    """API HTTP con un hilo por conexión y como mucho `workers` turnos del agente a la vez."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.engine = engine or Engine()
+    server.base_config = base_config or config_from_env()
+    ensure_gazetteer(server.base_config.aemet_api_key)
+    server.slots = threading.BoundedSemaphore(workers)
+    print(f"Meteorolog.IA escuchando en http://{host}:{server.server_address[1]} ({workers} turnos concurrentes)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# --- Modo batch ---
+
+def _group_by_session(requests_: list) -> list:
+    """Agrupa las preguntas por session_id (respetando su orden); sin sesión, cada una va sola."""
+    groups, by_session = [], {}
+    for index, request in enumerate(requests_):
+        session_id = request.get("session_id") if isinstance(request, dict) else None
+        if session_id is None:
+            groups.append([(index, request)])
+        elif session_id in by_session:
+            by_session[session_id].append((index, request))
+        else:
+            by_session[session_id] = [(index, request)]
+            groups.append(by_session[session_id])
+    return groups
+
+
+def _run_groups(groups: list, workers: int, base: EngineConfig, engine: Engine = None) -> list:
+    """Sesiones en paralelo (hasta `workers`); los turnos de cada sesión, en orden."""
+    engine = engine or Engine()
+
+    def run_group(group):
+        return [(index, handle_request(engine, base, request)) for index, request in group]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [item for result in pool.map(run_group, groups) for item in result]
+
+
+def batch(input_path: str, output_path: str, workers: int = 8, processes: int = 1, base_config: EngineConfig = None) -> dict:
+    """Lee preguntas JSONL ({"id"?, "question", "session_id"?, "config"?}) y escribe las
+    respuestas en el mismo orden. Con processes > 1 reparte las sesiones entre procesos."""
+    base = base_config or config_from_env()
+    with open(input_path, encoding="utf-8") as f:
+        requests_ = [json.loads(line) for line in f if line.strip()]
+    groups = _group_by_session(requests_)
+
+    start = time.perf_counter()
+    if processes > 1 and len(groups) > 1:
+        chunks = [groups[i::processes] for i in range(processes)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = pool.map(_run_groups, chunks, [workers] * processes, [base] * processes)
+            results = [item for part in parts for item in part]
+    else:
+        results = _run_groups(groups, workers, base)
+    elapsed = time.perf_counter() - start
+
+    answers = [None] * len(requests_)
+    for index, result in results:
+        answers[index] = result
+    with open(output_path, "w", encoding="utf-8") as f:
+        for answer in answers:
+            f.write(json.dumps(answer, ensure_ascii=False) + "\n")
+
+    errors = sum(1 for a in answers if "error" in a)
+    return {
+        "questions": len(requests_),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(len(requests_) / elapsed, 2) if elapsed else None,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Meteorolog.IA sin Streamlit: API HTTP local o modo batch JSONL.")
+    parser.add_argument("--model", help="modelo de Gemini (por defecto METEOROLOGIA_MODEL o gemini-2.5-flash)")
+    parser.add_argument("--temperature", type=float)
+    parser.add_argument("--no-router", action="store_true", help="todas las preguntas pasan por el agente")
+    parser.add_argument("--verbose-observations", action="store_true", help="observaciones Markdown en vez de compactas")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = commands.add_parser("serve", help="API HTTP: POST /ask, POST /reset, GET /health, GET /metrics")
+    serve_cmd.add_argument("--host", default=os.environ.get("METEOROLOGIA_HOST", "127.0.0.1"))
+    serve_cmd.add_argument("--port", type=int, default=int(os.environ.get("METEOROLOGIA_PORT", "8765")))
+    serve_cmd.add_argument("--workers", type=int, default=16, help="turnos del agente simultáneos")
+
+    batch_cmd = commands.add_parser("batch", help="procesa un JSONL de preguntas")
+    batch_cmd.add_argument("input")
+    batch_cmd.add_argument("output")
+    batch_cmd.add_argument("--workers", type=int, default=8, help="sesiones en paralelo por proceso")
+    batch_cmd.add_argument("--processes", type=int, default=1)
+
+    args = parser.parse_args(argv)
+    base = config_from_env(
+        model=args.model,
+        temperature=args.temperature,
+        use_router=False if args.no_router else None,
+        compact_observations=False if args.verbose_observations else None,
+    )
+    if args.command == "serve":
+        serve(args.host, args.port, args.workers, base_config=base)
+    else:
+        summary = batch(args.input, args.output, args.workers, args.processes, base_config=base)
+        print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import threading
+
+from metrics import registry
+
+# --- Coalescencia de peticiones (single-flight) ---
+# Si varias sesiones piden a la vez lo mismo a un upstream (la misma ciudad, el mismo
+# boletín AEMET, la misma búsqueda), solo la primera hace la petición real; el resto
+# espera a que termine y comparte su resultado (o su excepción).
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Grupo de llamadas deduplicadas por clave, con métricas de esperas y ratio de dedup."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executions": 0, "shared": 0, "max_waiters": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["shared"] += 1
+                self.stats["max_waiters"] = max(self.stats["max_waiters"], call.waiters)
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            calls = self.stats["calls"]
+            waiting = sum(c.waiters for c in self._calls.values())
+            return {
+                **self.stats,
+                "in_flight": len(self._calls),
+                "waiting": waiting,
+                "dedup_ratio": self.stats["shared"] / calls if calls else 0.0,
+            }
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def group(name: str) -> SingleFlight:
+    """Grupo single-flight compartido por todo el proceso para un upstream."""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+            # Ratio de dedup y esperas (ahora y máximo histórico) por upstream
+            for metric in ("dedup_ratio", "waiting", "max_waiters", "in_flight"):
+                registry.gauge(f"singleflight_{metric}", lambda g=_groups[name], m=metric: g.metrics()[m], group=name)
+        return _groups[name]
+
+
+def all_metrics() -> dict:
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {g.name: g.metrics() for g in groups}
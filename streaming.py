@@ -0,0 +1,45 @@
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- Streaming de la respuesta final ---
+# El agente ReAct genera "Thought: ... Final Answer: ..." token a token. Este callback
+# detecta el segmento "Final Answer:" en el flujo del LLM y lo va escribiendo en el
+# contenedor del mensaje del asistente según llega, sin esperar al final del AgentExecutor.
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+CURSOR = "▌"
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """Escribe incrementalmente en `container` (un st.empty()) el texto tras "Final Answer:"."""
+
+    def __init__(self, container):
+        self.container = container
+        self.started_at = time.perf_counter()
+        self.first_token_latency = None
+        self.streamed = ""
+        self._buffer = ""
+
+    def _reset(self) -> None:
+        # Cada llamada al LLM (cada paso del ReAct) empieza con un buffer limpio
+        self._buffer = ""
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self._reset()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self._reset()
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._buffer += token
+        start = self._buffer.find(FINAL_ANSWER_MARKER)
+        if start < 0:
+            return
+        text = self._buffer[start + len(FINAL_ANSWER_MARKER):].lstrip()
+        if not text:
+            return
+        if self.first_token_latency is None:
+            self.first_token_latency = time.perf_counter() - self.started_at
+        self.streamed = text
+        self.container.markdown(text + CURSOR)
@@ -0,0 +1,103 @@
+# --- Estilos de la app ---
+# Constantes de la interfaz en un módulo aparte: agente.py se re-ejecuta entero en cada rerun
+# de Streamlit, pero un módulo importado se evalúa una sola vez por proceso.
+
+# Estilos CSS avanzados: Glassmorphism, Neumorphism, Animaciones
+CSS = """
+<style>
+    /* Importar fuente futurista */
+    @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@300;500;700&display=swap');
+
+    /* Variables de tema */
+    :root {
+        --primary-color: #00d2ff;
+        --secondary-color: #3a7bd5;
+        --bg-color: #0f172a;
+        --card-bg: rgba(30, 41, 59, 0.7);
+        --text-color: #e2e8f0;
+        --accent: #f59e0b;
+    }
+
+    /* Reset y base */
+    html, body, [class*="css"] {
+        font-family: 'Outfit', sans-serif;
+        color: var(--text-color);
+    }
+    
+    .stApp {
+        background-color: var(--bg-color);
+        background-image: 
+            radial-gradient(at 0% 0%, rgba(58, 123, 213, 0.15) 0px, transparent 50%),
+            radial-gradient(at 100% 100%, rgba(245, 158, 11, 0.1) 0px, transparent 50%);
+        background-attachment: fixed;
+    }
+
+    /* Títulos con gradiente */
+    h1, h2, h3 {
+        background: linear-gradient(90deg, var(--primary-color), var(--secondary-color));
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        font-weight: 700;
+        letter-spacing: -0.5px;
+    }
+
+    /* Tarjetas Glassmorphism */
+    .glass-card {
+        background: var(--card-bg);
+        backdrop-filter: blur(12px);
+        -webkit-backdrop-filter: blur(12px);
+        border: 1px solid rgba(255, 255, 255, 0.1);
+        border-radius: 16px;
+        padding: 20px;
+        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);
+        margin-bottom: 20px;
+        transition: transform 0.2s ease;
+    }
+    .glass-card:hover {
+        transform: translateY(-2px);
+        border-color: rgba(255, 255, 255, 0.2);
+    }
+
+    /* Sidebar personalizado */
+    section[data-testid="stSidebar"] {
+        background-color: #0a0e17;
+        border-right: 1px solid rgba(255,255,255,0.05);
+    }
+
+    /* Chat Messages */
+    .stChatMessage {
+        background: transparent;
+        border: none;
+    }
+    [data-testid="stChatMessageContent"] {
+        background: rgba(255, 255, 255, 0.05);
+        border: 1px solid rgba(255, 255, 255, 0.1);
+        border-radius: 12px;
+        padding: 15px;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    }
+    
+    /* Input de chat estilizado */
+    .stChatInputContainer {
+        padding-bottom: 20px;
+    }
+    .stChatInputContainer input {
+        background: rgba(15, 23, 42, 0.8) !important;
+        border: 1px solid rgba(255, 255, 255, 0.2) !important;
+        color: white !important;
+        border-radius: 24px !important;
+    }
+    
+    /* Ocultar elementos default de Streamlit */
+    #MainMenu {visibility: hidden;}
+    footer {visibility: hidden;}
+    .stDeployButton {display:none;}
+    
+    /* Animación de carga sutil para el spinner */
+    .stSpinner > div {
+        border-top-color: var(--primary-color) !important;
+    }
+</style>
+"""
+
+WELCOME = "¡Hola! Soy **Meteorolog.IA**. 🌩️\nEstoy conectada a satélites y estaciones en tiempo real.\n¿En qué ciudad te encuentras hoy?"
@@ -0,0 +1,274 @@
+import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aemet import AemetError, warnings_store
+from forecast import fetch_forecast, fetch_forecast_multi
+from forecast_engine import forecast_report
+from gazetteer import resolve_place
+from metrics import registry
+from observations import compact_alerts, compact_weather
+from parallel_tools import run_parallel
+from prefetch import prefetcher
+from search import web_search
+
+# --- Herramientas del agente ---
+# Funciones puras (sin Streamlit): la configuración que necesitan, como la API key de AEMET,
+# llega por parámetro. Las usan la app (agente.py), el fast-path del router y benchmark.py.
+
+
+def get_current_time(query: str = "") -> str:
+    """Devuelve la fecha y hora actual exacta. Úsala cuando pregunten 'qué hora es' o 'qué día es hoy'."""
+    now = datetime.datetime.now()
+    return now.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def get_weather(location: str, compact: bool = False) -> str:
+    """Obtiene el clima actual y pronóstico para una ciudad usando Open-Meteo API.
+    Devuelve un string detallado con temperatura, viento y máximas/mínimas (clave=valor si compact)."""
+    try:
+        # 1. Geocoding (nomenclátor local y, si no, geocoder cacheado; ver gazetteer.py/geocoding.py)
+        # Limpiamos la location para evitar caracteres raros
+        location = location.strip()
+        
+        try:
+            place = resolve_place(location)
+        except Exception:
+            return f"Error de conexión al buscar la ubicación '{location}'."
+
+        if place is None:
+            return f"No encontré la ubicación '{location}'. Por favor verifica el nombre."
+            
+        # Alimenta el prefetch de ubicaciones populares (ver prefetch.py)
+        prefetcher.record(location, "weather")
+        
+        # 2. Weather Data (cacheado por celda de rejilla, ver forecast.py)
+        try:
+            weather_res = fetch_forecast(place["latitude"], place["longitude"])
+        except Exception:
+            return "Error conectando con el servicio de clima."
+        
+        return compact_weather(place, weather_res) if compact else format_weather_report(place, weather_res)
+
+    except Exception as e:
+        return f"Ocurrió un error inesperado al obtener el clima: {str(e)}"
+
+
+def format_weather_report(place: dict, weather_res: dict) -> str:
+    """Formatea un payload de Open-Meteo (ver forecast.py) como informe para el LLM."""
+    name = place["name"]
+    country = place["country"]
+    current = weather_res.get("current", {})
+    daily = weather_res.get("daily", {})
+    current_units = weather_res.get("current_units", {})
+    
+    # Datos Actuales
+    temp = current.get("temperature_2m", "N/A")
+    feels_like = current.get("apparent_temperature", "N/A")
+    humidity = current.get("relative_humidity_2m", "N/A")
+    wind = current.get("wind_speed_10m", "N/A")
+    
+    # Datos Diarios (Hoy)
+    if daily and 'temperature_2m_max' in daily:
+        max_temp = daily['temperature_2m_max'][0]
+        min_temp = daily['temperature_2m_min'][0]
+        sunrise = daily.get('sunrise', [''])[0][-5:] # Solo la hora
+        sunset = daily.get('sunset', [''])[0][-5:]
+    else:
+        max_temp = min_temp = sunrise = sunset = "N/A"
+
+    # Formateo de respuesta estructurada para el LLM
+    report = (
+        f"📍 **Informe Climático para {name}, {country}**\n"
+        f"🌡️ **Actual:** {temp}{current_units.get('temperature_2m','°C')} (Sensación: {feels_like}°)\n"
+        f"💧 **Humedad:** {humidity}%\n"
+        f"💨 **Viento:** {wind} km/h\n"
+        f"📅 **Pronóstico Hoy:** Máx {max_temp}° / Mín {min_temp}°\n"
+        f"☀️ **Sol:** Sale {sunrise} / Pone {sunset}\n"
+    )
+    return report
+
+
+def get_weather_multi(locations: str, compact: bool = False) -> str:
+    """Clima de varias ciudades a la vez: geocodifica en paralelo y pide todos los
+    pronósticos a Open-Meteo en una única petición multi-coordenada."""
+    try:
+        names = [n.strip() for n in re.split(r"[,;|\n]", locations) if n.strip()]
+        if not names:
+            return "Indica al menos una ciudad, separadas por comas (ej: 'Madrid, Valencia, Bilbao')."
+
+        # 1. Geocoding concurrente (la mayoría saldrá de la caché)
+        with ThreadPoolExecutor(max_workers=min(8, len(names))) as pool:
+            futures = [pool.submit(resolve_place, n) for n in names]
+            places = []
+            for future in futures:
+                try:
+                    places.append(future.result())
+                except Exception:
+                    places.append(None)
+
+        found = [p for p in places if p is not None]
+        for n, p in zip(names, places):
+            if p is not None:
+                prefetcher.record(n, "weather")
+        if not found:
+            return "\n".join(f"No encontré la ubicación '{n}'." for n in names)
+
+        # 2. Una sola petición de pronóstico para todas las ciudades
+        try:
+            payloads = iter(fetch_forecast_multi([(p["latitude"], p["longitude"]) for p in found]))
+        except Exception:
+            return "Error conectando con el servicio de clima."
+
+        # Un informe por ciudad, en el orden pedido
+        formatter = compact_weather if compact else format_weather_report
+        reports = []
+        for n, p in zip(names, places):
+            if p is None:
+                reports.append(f"No encontré la ubicación '{n}'.")
+                continue
+            weather_res = next(payloads)
+            if weather_res is None:
+                reports.append(f"No hay datos de clima para '{p['name']}' en este momento.")
+            else:
+                reports.append(formatter(p, weather_res))
+        return "\n".join(reports)
+
+    except Exception as e:
+        return f"Ocurrió un error inesperado al obtener el clima: {str(e)}"
+
+
+def get_forecast(query: str, compact: bool = False) -> str:
+    """Pronóstico por horas o de varios días para un periodo concreto.
+    Input 'Ciudad | periodo' (ej: 'Sevilla | mañana por la tarde'); sin periodo, hoy."""
+    try:
+        location, _, period = query.partition("|") if "|" in query else query.partition(",")
+        location = location.strip()
+        if not location:
+            return "Indica la ciudad y el periodo (ej: 'Sevilla | fin de semana')."
+
+        try:
+            place = resolve_place(location)
+        except Exception:
+            return f"Error de conexión al buscar la ubicación '{location}'."
+        if place is None:
+            return f"No encontré la ubicación '{location}'. Por favor verifica el nombre."
+
+        prefetcher.record(location, "forecast")
+
+        # Series horarias de 7 días en columnas (ver forecast_engine.py)
+        try:
+            return forecast_report(place, period.strip(), compact=compact)
+        except Exception:
+            return "Error conectando con el servicio de clima."
+
+    except Exception as e:
+        return f"Ocurrió un error inesperado al obtener el pronóstico: {str(e)}"
+
+
+def search_func(query: str) -> str:
+    """Busca en internet usando DuckDuckGo como fallback (cacheado y con rotación de backends, ver search.py)."""
+    try:
+        results = web_search.text(query, max_results=3)
+        if results:
+            summary = "\n".join([f"- {r['title']}: {r['body']}" for r in results])
+            return f"Resultados de búsqueda:\n{summary}"
+        return "No encontré información relevante en la búsqueda rápida."
+    except Exception as e:
+        return f"Error en búsqueda web: {str(e)}"
+
+
+def check_aemet_alerts(location: str, compact: bool = False, api_key: str = "") -> str:
+    """Verifica alertas oficiales de AEMET. Requiere API Key (el agente no pasa keys:
+    build_tools la fija con partial)."""
+    if not api_key:
+        return f"⚠️ No tengo configurarada la API Key de AEMET. Buscando noticias recientes sobre alertas en {location}...\n" + search_func(f"Alertas meteorológicas AEMET {location} última hora")
+
+    prefetcher.record(location, "alerts")
+
+    try:
+        # Boletín indexado en memoria y refrescado en segundo plano (ver aemet.py)
+        warnings_store.ensure_loaded(api_key)
+    except AemetError as e:
+        return str(e)
+    except Exception as e:
+        return search_func(f"Alertas clima {location}")
+
+    warnings = warnings_store.lookup(location)
+    if warnings is None:
+        # Sin zona no sabemos si hay avisos: nunca contestar "sin avisos" por no encontrar el lugar
+        return (f"⚠️ No he podido asociar '{location}' a una zona de avisos de AEMET (prueba con la provincia). "
+                f"Buscando noticias recientes sobre alertas en {location}...\n"
+                + search_func(f"Alertas meteorológicas AEMET {location} última hora"))
+    if compact:
+        return compact_alerts(location, warnings, stale=warnings_store.is_stale())
+    return format_alerts_report(location, warnings)
+
+
+def format_alerts_report(location: str, warnings: list) -> str:
+    """Formatea los avisos de AEMET (ver aemet.py) como informe Markdown."""
+    # Con AEMET caída seguimos sirviendo el último boletín bueno, avisando de su antigüedad
+    stale_note = ""
+    if warnings_store.is_stale():
+        stale_note = f"\n(Boletín de las {datetime.datetime.fromtimestamp(warnings_store.updated_at).strftime('%H:%M')}; AEMET no responde ahora mismo.)"
+    if not warnings:
+        return f"✅ No hay avisos vigentes de AEMET para '{location}' en el boletín de hoy." + stale_note
+
+    lines = [f"🚨 **AVISOS AEMET VIGENTES para {location}:**"]
+    for w in warnings:
+        onset = w.onset.strftime("%d/%m %H:%M") if w.onset else "?"
+        expires = w.expires.strftime("%d/%m %H:%M") if w.expires else "?"
+        lines.append(f"- Nivel **{w.level}** por {w.phenomenon} en {w.area} ({w.province}, zona {w.zone}), de {onset} a {expires}")
+    return "\n".join(lines) + stale_note
+
+
+def build_tools(compact: bool = False, aemet_api_key: str = "") -> list:
+    """Herramientas del agente. Con compact=True las observaciones van en clave=valor (ver observations.py).
+    Se construyen una vez por executor (engine.py cachea el executor por configuración)."""
+    from langchain_core.tools import Tool
+
+    legend = " Salida clave=valor: t/st(sensación)/max/min en °C, hr en %, v en km/h." if compact else ""
+    tools = [
+        Tool(
+            name="get_current_time",
+            func=get_current_time,
+            description="Usa esto para obtener la fecha y hora actual. Input: string vacío."
+        ),
+        Tool(
+            name="get_weather",
+            func=partial(get_weather, compact=compact),
+            description="Usa esto para obtener el clima actual y pronóstico. Input: nombre de la ciudad (ej: 'Madrid')." + legend
+        ),
+        Tool(
+            name="get_weather_multi",
+            func=partial(get_weather_multi, compact=compact),
+            description="Usa esto para comparar o consultar el clima de VARIAS ciudades en una sola llamada. Input: ciudades separadas por comas (ej: 'Madrid, Valencia, Bilbao')." + legend
+        ),
+        Tool(
+            name="get_forecast",
+            func=partial(get_forecast, compact=compact),
+            description="Usa esto para el pronóstico de un periodo concreto (por horas o varios días: 'mañana por la tarde', 'fin de semana', 'próximos 3 días', '¿cuándo lloverá?'). Input: 'ciudad | periodo' (ej: 'Sevilla | mañana por la tarde')."
+            + (" Salida clave=valor: temperaturas en °C, pp=prob. de lluvia en %, prec en mm, vmax en km/h." if compact else "")
+        ),
+        Tool(
+            name="check_aemet_alerts",
+            func=partial(check_aemet_alerts, compact=compact, api_key=aemet_api_key),
+            description="Usa esto SOLO para verificar alertas de seguridad oficiales en España (AEMET). Input: nombre de la ciudad/región."
+        )
+    ]
+    
+    # Cada herramienta mide su latencia en el histograma tool_seconds (ver metrics.py)
+    tools = [
+        Tool(name=t.name, func=registry.timed("tool_seconds", tool=t.name)(t.func), description=t.description)
+        for t in tools
+    ]
+    base_tools = list(tools)
+    tools.append(
+        Tool(
+            name="run_parallel",
+            func=lambda text: run_parallel(text, base_tools),
+            description="Usa esto para ejecutar A LA VEZ varias herramientas independientes en un solo paso (ej: clima y alertas de la misma ciudad). Input: llamadas separadas por ';' con formato 'herramienta: input' (ej: 'get_weather: Valencia; check_aemet_alerts: Valencia')."
+        )
+    )
+    return tools